@@ -0,0 +1,130 @@
+from __future__ import annotations
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+def team_means(team_sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    The mean On-base Plus Slugging and Home Runs for each team.
+
+    Parameters
+    ----------
+    team_sums : pd.DataFrame
+        Per-team sums and counts, from BattingAggregates.team_sums.
+
+    Returns
+    -------
+    pd.DataFrame
+        'OPS' and 'HR' columns, indexed by team.
+    """
+    sums = team_sums[team_sums['rows'] > 0]
+    return pd.DataFrame({'OPS': sums['OPS'] / sums['OPS_count'], 'HR': sums['HR'] / sums['HR_count']})
+
+def player_averages(player_sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    The total Plate Appearances and mean Batting Average for each player.
+
+    Parameters
+    ----------
+    player_sums : pd.DataFrame
+        Per-player sums and counts, from BattingAggregates.player_sums.
+
+    Returns
+    -------
+    pd.DataFrame
+        'PA' and 'BA' columns, indexed by player.
+    """
+    sums = player_sums[player_sums['rows'] > 0]
+    return pd.DataFrame({'PA': sums['PA'], 'BA': sums['BA'] / sums['BA_count']})
+
+def player_hr_so(player_sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    The total Home Runs and Strike Outs for each player.
+
+    Parameters
+    ----------
+    player_sums : pd.DataFrame
+        Per-player sums and counts, from BattingAggregates.player_sums.
+
+    Returns
+    -------
+    pd.DataFrame
+        'HR' and 'SO' columns, indexed by player.
+    """
+    return player_sums.loc[player_sums['rows'] > 0, ['HR', 'SO']]
+
+class BattingAggregates:
+    """
+    Per-team and per-player sum/count tables over the cleaned batting
+    DataFrame. Teams and players are hashed (factorized) once, when the
+    object is created. Each table is then computed with np.bincount over
+    the column arrays for the given row filter (e.g. only records with at
+    least 50 games), and memoized by that filter, so threshold variants
+    don't group the DataFrame again.
+    """
+
+    def __init__(self, PBDF: pd.DataFrame):
+        # Codes are -1 for missing keys, which (like groupby) are left out
+        self._team_codes, teams = pd.factorize(PBDF['Team'], sort=True)
+        self._player_codes, players = pd.factorize(PBDF['Player'], sort=True)
+        self.teams = pd.Index(teams, name='Team')
+        self.players = pd.Index(players, name='Player')
+        self._columns = {column: PBDF[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            for column in ('G', 'PA', 'HR', 'SO', 'BA', 'OPS')}
+        self._memo = {}
+
+    @property
+    def team_count(self) -> int:
+        return len(self.teams)
+
+    @property
+    def player_count(self) -> int:
+        return len(self.players)
+
+    def _sums(self, codes: np.ndarray, index: pd.Index, mask: np.ndarray, sums: list[str],
+            means: list[str]) -> pd.DataFrame:
+        codes = codes[mask]
+        table = {'rows': np.bincount(codes, minlength=len(index))}
+        for column in sums:
+            # Exact for integer totals up to 2**53. Like groupby's sum, missing values count as 0.
+            values = np.nan_to_num(self._columns[column][mask])
+            table[column] = np.bincount(codes, values, len(index)).astype(np.int64)
+        for column in means:
+            # Means are kept as a sum and a count of the non-missing values
+            values = self._columns[column][mask]
+            present = ~np.isnan(values)
+            table[column] = np.bincount(codes[present], values[present], len(index))
+            table[f'{column}_count'] = np.bincount(codes[present], minlength=len(index))
+        return pd.DataFrame(table, index=index)
+
+    def team_sums(self, min_games: int = 0) -> pd.DataFrame:
+        """
+        Per-team sums and counts ('rows', 'HR', 'HR_count', 'OPS', 'OPS_count'),
+        only including records with at least min_games games.
+        """
+        key = ('team', min_games)
+        if key not in self._memo:
+            mask = (self._team_codes >= 0) & (self._columns['G'] >= min_games)
+            self._memo[key] = self._sums(self._team_codes, self.teams, mask, [], ['OPS', 'HR'])
+        return self._memo[key]
+
+    def player_sums(self, min_pa: int = 0) -> pd.DataFrame:
+        """
+        Per-player sums and counts ('rows', 'PA', 'HR', 'SO', 'BA', 'BA_count'),
+        only including records with at least min_pa plate appearances.
+        """
+        key = ('player', min_pa)
+        if key not in self._memo:
+            mask = (self._player_codes >= 0) & (self._columns['PA'] >= min_pa)
+            self._memo[key] = self._sums(self._player_codes, self.players, mask, ['PA', 'HR', 'SO'], ['BA'])
+        return self._memo[key]
+
+    def team_means(self, min_games: int = 0) -> pd.DataFrame:
+        return team_means(self.team_sums(min_games))
+
+    def player_averages(self, min_pa: int = 0) -> pd.DataFrame:
+        return player_averages(self.player_sums(min_pa))
+
+    def player_hr_so(self, min_pa: int = 0) -> pd.DataFrame:
+        return player_hr_so(self.player_sums(min_pa))
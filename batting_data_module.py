@@ -0,0 +1,128 @@
+from __future__ import annotations
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import pathlib
+from batting_schema_module import BATTING_DTYPES
+from startup_module import lazy_import
+
+pd = lazy_import('pandas')
+
+# Some column names are updated for readability
+COLUMN_NAMES = {'Name': 'Player', 'Tm': 'Team'}
+STRING_COLUMNS = [COLUMN_NAMES.get(column, column) for column, dtype in BATTING_DTYPES.items() if dtype == 'string']
+# Changing the schema invalidates the cache
+SCHEMA_VERSION = hashlib.sha1(repr(sorted(BATTING_DTYPES.items())).encode()).hexdigest()[:12]
+
+def clean_batting_data(PBDF: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the standard clean up to the raw batting DataFrame.
+
+    Parameters
+    ----------
+    PBDF : pd.DataFrame
+        The batting statistics, as read from the csv file with BATTING_DTYPES.
+
+    Returns
+    -------
+    pd.DataFrame
+        The cleaned DataFrame.
+    """
+    PBDF = PBDF.rename(columns=COLUMN_NAMES)
+    # Remove records where Team is 'TOT' (this is an aggregate and creates redundancy)
+    PBDF = PBDF[PBDF['Team'] != 'TOT']
+    # The 'TOT' category is now unused, drop it so it doesn't show up when grouping by team
+    PBDF = PBDF.assign(Team=PBDF['Team'].cat.remove_unused_categories())
+    return PBDF
+
+def read_batting_data(data_file: pathlib.Path) -> pd.DataFrame:
+    """
+    Read and clean a batting statistics csv file.
+
+    Parameters
+    ----------
+    data_file : pathlib.Path
+        Location of the csv file.
+
+    Returns
+    -------
+    pd.DataFrame
+        The cleaned DataFrame.
+    """
+    return clean_batting_data(pd.read_csv(data_file, dtype=BATTING_DTYPES))
+
+def _file_hash(path: pathlib.Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def load_batting_data(data_file: pathlib.Path, cache_dir: pathlib.Path | None = None) -> pd.DataFrame:
+    """
+    Return the cleaned batting DataFrame for data_file, from a binary cache
+    in cache_dir when possible. The cache is stored in the Feather (columnar)
+    format if pyarrow is installed, and as a pickle otherwise. It is valid
+    while the csv file's mtime and size are unchanged; if they changed but
+    the file's SHA-256 did not, the cache is still used.
+
+    Parameters
+    ----------
+    data_file : pathlib.Path
+        Location of the csv file.
+    cache_dir : pathlib.Path | None
+        Where to keep the cache. None reads the csv file without a cache.
+
+    Returns
+    -------
+    pd.DataFrame
+        The cleaned DataFrame.
+    """
+    if cache_dir is None:
+        return read_batting_data(data_file)
+    data_file = pathlib.Path(data_file).resolve()
+    cache_format = 'feather' if importlib.util.find_spec('pyarrow') else 'pickle'
+    # One cache per csv file, identified by its full path
+    cache_name = f'{data_file.stem}-{hashlib.sha1(str(data_file).encode()).hexdigest()[:12]}'
+    cache_file = pathlib.Path(cache_dir) / f'{cache_name}.{cache_format}'
+    meta_file = pathlib.Path(cache_dir) / f'{cache_name}.json'
+    stat = data_file.stat()
+    try:
+        meta = json.loads(meta_file.read_text())
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get('format') == cache_format and meta.get('schema') == SCHEMA_VERSION and cache_file.exists():
+        if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+            return _read_cache(cache_file, cache_format)
+        file_hash = _file_hash(data_file)
+        if meta.get('sha256') == file_hash:
+            # Touched, but not changed
+            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            meta_file.write_text(json.dumps(meta))
+            return _read_cache(cache_file, cache_format)
+    else:
+        file_hash = _file_hash(data_file)
+    logging.info('Caching %s in %s', data_file, cache_file)
+    PBDF = read_batting_data(data_file)
+    pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so an interrupted write never leaves a broken cache
+    temp_file = cache_file.with_name(cache_file.name + '.tmp')
+    if cache_format == 'feather':
+        # Feather only stores a default index, so the original index is kept as a column
+        PBDF.reset_index(names='index').to_feather(temp_file)
+    else:
+        PBDF.to_pickle(temp_file)
+    os.replace(temp_file, cache_file)
+    meta_file.write_text(json.dumps({'source': str(data_file), 'format': cache_format, 'schema': SCHEMA_VERSION,
+        'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_hash}))
+    return PBDF
+
+def _read_cache(cache_file: pathlib.Path, cache_format: str) -> pd.DataFrame:
+    if cache_format == 'feather':
+        PBDF = pd.read_feather(cache_file).set_index('index').rename_axis(None)
+        # Arrow strings come back as 'object', so restore the string dtype
+        PBDF[STRING_COLUMNS] = PBDF[STRING_COLUMNS].astype(pd.StringDtype())
+        return PBDF
+    return pd.read_pickle(cache_file)
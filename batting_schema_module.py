@@ -0,0 +1,75 @@
+from __future__ import annotations
+import pathlib
+from startup_module import lazy_import
+
+pd = lazy_import('pandas')
+
+# The dtypes of the columns in the batting csv file (as named in the file), passed
+# straight to pd.read_csv. Low cardinality text columns are categoricals, and the
+# counting stats are 16 bit integers, far above any season's total (e.g. 262 hits,
+# 73 home runs). The integers are the pandas nullable ones (capitalized, 'Int16'),
+# as any column can have blanks: the league average row has no rank, age or team,
+# and older seasons have no CS, GDP, SF or IBB. A value that doesn't fit raises an
+# error when the file is read, where a NumPy integer ('int16') would silently
+# wrap around.
+BATTING_DTYPES = {
+    'Rk': 'Int16',
+    'Name': 'string',
+    'Age': 'Int8',
+    'Tm': 'category',
+    'Lg': 'category',
+    'G': 'Int16',
+    'PA': 'Int16',
+    'AB': 'Int16',
+    'R': 'Int16',
+    'H': 'Int16',
+    '2B': 'Int16',
+    '3B': 'Int16',
+    'HR': 'Int16',
+    'RBI': 'Int16',
+    'SB': 'Int16',
+    'CS': 'Int16',
+    'BB': 'Int16',
+    'SO': 'Int16',
+    'BA': 'float32',
+    'OBP': 'float32',
+    'SLG': 'float32',
+    'OPS': 'float32',
+    'OPS+': 'Int16',
+    'TB': 'Int16',
+    'GDP': 'Int16',
+    'HBP': 'Int16',
+    'SH': 'Int16',
+    'SF': 'Int16',
+    'IBB': 'Int16',
+    'Pos Summary': 'category',
+    'Name-additional': 'string',
+}
+
+def memory_report(data_file: pathlib.Path) -> pd.DataFrame:
+    """
+    Compare the memory used by each column of the batting csv file when read
+    with the pandas default dtypes and with BATTING_DTYPES.
+
+    Parameters
+    ----------
+    data_file : pathlib.Path
+        Location of the csv file.
+
+    Returns
+    -------
+    pd.DataFrame
+        The dtype and bytes used by each column (and the total) before and
+        after applying the schema.
+    """
+    before = pd.read_csv(data_file)
+    after = pd.read_csv(data_file, dtype=BATTING_DTYPES)
+    report = pd.DataFrame({
+        'dtype before': before.dtypes.astype(str),
+        'bytes before': before.memory_usage(index=False, deep=True),
+        'dtype after': after.dtypes.astype(str),
+        'bytes after': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['Total'] = ['', report['bytes before'].sum(), '', report['bytes after'].sum()]
+    report['saved'] = (1 - report['bytes after'] / report['bytes before']).map('{:.0%}'.format)
+    return report
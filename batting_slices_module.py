@@ -0,0 +1,101 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from shared_result_module import SharedArray, SharedResult, share_array
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# The columns the reports use, besides Team and Player
+VALUE_COLUMNS = ('G', 'PA', 'HR', 'SO', 'BA', 'OPS')
+
+@dataclass(frozen=True)
+class SharedBattingSlices:
+    """
+    A small, picklable handle to BattingSlices whose data is in a shared
+    memory block; see BattingSlices.share and BattingSlices.attach.
+    """
+    by: str
+    data: SharedResult
+    labels: tuple
+    offsets: tuple
+    teams: tuple
+    players: tuple
+
+class BattingSlices:
+    """
+    The columns of the cleaned batting DataFrame that the reports use, split
+    into slices by the values of one column (e.g. one slice per team). The
+    data is a single float64 array, with a row for each column (the team
+    and player codes, then VALUE_COLUMNS) and the records sorted by slice,
+    so each slice is a contiguous view of it. This array can be shared with
+    worker processes, which then only need the small handle returned by
+    share to rebuild any slice.
+    """
+
+    def __init__(self, by: str, data: np.ndarray, labels: tuple, offsets: tuple, teams: tuple, players: tuple):
+        self.by = by
+        self.data = data
+        self.labels = labels
+        self.offsets = offsets
+        self.teams = teams
+        self.players = players
+        self._players = pd.array(players, dtype=pd.StringDtype())
+        self._shared = None
+
+    @classmethod
+    def from_frame(cls, PBDF: pd.DataFrame, by: str) -> 'BattingSlices':
+        """
+        Split PBDF into slices by the values of column by, in sorted order.
+        Records with no value in that column (e.g. the league average row has
+        no team) are in no slice.
+        """
+        keys, labels = pd.factorize(PBDF[by], sort=True)
+        team_codes, teams = pd.factorize(PBDF['Team'], sort=True)
+        player_codes, players = pd.factorize(PBDF['Player'], sort=True)
+        rows = np.flatnonzero(keys >= 0)
+        # A stable sort keeps the records of each slice in their original order
+        order = rows[np.argsort(keys[rows], kind='stable')]
+        data = np.vstack([team_codes, player_codes]
+            + [PBDF[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in VALUE_COLUMNS])[:, order]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(keys[rows], minlength=len(labels)))])
+        return cls(by, np.ascontiguousarray(data), tuple(labels), tuple(offsets.tolist()),
+            tuple(teams), tuple(players))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def frame(self, index: int) -> pd.DataFrame:
+        """
+        The DataFrame of slice index, with the 'Team' and 'Player' columns and
+        VALUE_COLUMNS (as float64).
+        """
+        data = self.data[:, self.offsets[index]:self.offsets[index + 1]]
+        codes = data[:2].astype(np.int64)
+        # Code -1 is a missing team or player
+        frame = {'Team': pd.Categorical.from_codes(codes[0], categories=self.teams),
+            'Player': self._players.take(codes[1], allow_fill=True)}
+        frame.update({column: data[row] for row, column in enumerate(VALUE_COLUMNS, start=2)})
+        return pd.DataFrame(frame)
+
+    def share(self) -> SharedBattingSlices:
+        """
+        Copy the data into a new shared memory block and return the handle to
+        pass to the worker processes (see attach). The caller owns the block:
+        open SharedArray(handle.data) and close it, once the workers are done,
+        to free it.
+        """
+        return SharedBattingSlices(self.by, share_array(self.data), self.labels, self.offsets,
+            self.teams, self.players)
+
+    @classmethod
+    def attach(cls, handle: SharedBattingSlices) -> 'BattingSlices':
+        """
+        The BattingSlices of a handle from share, using the shared data
+        without copying it. Meant to be called once in each worker process.
+        """
+        shared = SharedArray(handle.data, unlink=False)
+        slices = cls(handle.by, shared.array, handle.labels, handle.offsets, handle.teams, handle.players)
+        # Keeps the block mapped for as long as the slices are in use
+        slices._shared = shared
+        return slices
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+File name: data_class_benchmark.py
+Description: Compares the memory use and lookup times of the original
+    (plain dataclass, list based) Employee and Company with the slotted
+    classes, the indexed Company and the columnar EmployeeTable from
+    data_class_module.py, on generated employee records. Every lookup is
+    checked to return the same employee.
+Python Version: 3.x
+
+NOTE: The list scans of the original Company are slow, so they are only
+timed for --scan_lookups lookups.
+"""
+
+import sys
+import gc
+import logging
+import random
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import List
+# Imported up front, so its import isn't counted in the memory of the columnar EmployeeTable
+import numpy
+from data_class_module import Company, Employee, EmployeeTable
+from logging_module import setup_logging
+from startup_module import script_parser
+
+# The original classes, kept as a baseline
+@dataclass
+class DictPerson:
+    f_name: str
+    l_name: str
+    age: int
+
+@dataclass
+class DictEmployee(DictPerson):
+    emp_id: int = 0
+    dept: str = 'Unknown'
+
+    def __eq__(self, other):
+        return self.emp_id == other.emp_id
+
+@dataclass
+class ListCompany:
+    name: str
+    employees: List[DictEmployee]
+
+DEPTS = ('Accounting', 'Engineering', 'HR', 'Legal', 'Marketing', 'Operations', 'Sales', 'Support')
+
+def make_records(num_employees: int, seed: int = 0) -> list[tuple]:
+    """
+    Generate (f_name, l_name, age, emp_id, dept) records with unique emp_ids,
+    in random order.
+    """
+    rng = random.Random(seed)
+    emp_ids = rng.sample(range(10 * num_employees), num_employees)
+    # Distinct name strings, as when they are read from a file
+    return [(f'First{rng.randrange(5000)}', f'Last{rng.randrange(50000)}', rng.randint(18, 70), emp_id,
+        rng.choice(DEPTS)) for emp_id in emp_ids]
+
+def measure(build: Callable[[], object]) -> tuple[object, float, int]:
+    """Return build(), the time it took and the memory it allocated (in bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-n', '--num_employees', type=int, default=1_000_000,
+        help='The number of employee records to generate.')
+    parser.add_argument('-l', '--lookups', type=int, default=100_000,
+        help='The number of emp_id lookups to time.')
+    parser.add_argument('-s', '--scan_lookups', type=int, default=100,
+        help='The number of emp_id lookups to time with the list scans of the original Company.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    records = make_records(args.num_employees)
+    logging.info('Generated %d employee records', len(records))
+    rng = random.Random(1)
+    lookup_ids = [rng.choice(records)[3] for _ in range(args.lookups)]
+    scan_ids = lookup_ids[:args.scan_lookups]
+
+    print('=' * 50)
+    print(f'Building {len(records)} employees (time and memory, excluding the name strings)')
+    original, elapsed, original_size = measure(lambda: ListCompany('FooBar', [DictEmployee(*r) for r in records]))
+    print(f'{"dataclass":>12}: {elapsed:8.2f}s {original_size / 1024**2:9.1f} MB')
+    employees, elapsed, size = measure(lambda: [Employee(*r) for r in records])
+    print(f'{"slots":>12}: {elapsed:8.2f}s {size / 1024**2:9.1f} MB ({size / original_size:.0%} of the original)')
+    company, elapsed, index_size = measure(lambda: Company('FooBar', employees))
+    # The indexed Company holds the slotted employees, so both are counted
+    print(f'{"+ indexes":>12}: {elapsed:8.2f}s {(size + index_size) / 1024**2:9.1f} MB '
+        f'({(size + index_size) / original_size:.0%} of the original)')
+    table, elapsed, size = measure(lambda: EmployeeTable.from_employees(employees))
+    print(f'{"columnar":>12}: {elapsed:8.2f}s {size / 1024**2:9.1f} MB ({size / original_size:.0%} of the original)')
+
+    print('=' * 50)
+    print('Finding employees by emp_id (time per lookup)')
+    start = time.perf_counter()
+    expected = [next(e for e in original.employees if e.emp_id == emp_id) for emp_id in scan_ids]
+    baseline = (time.perf_counter() - start) / len(scan_ids)
+    print(f'{"list scan":>12}: {baseline * 1e6:10.2f}us')
+    start = time.perf_counter()
+    found = [company.find(emp_id) for emp_id in lookup_ids]
+    elapsed = (time.perf_counter() - start) / len(lookup_ids)
+    if [(e.full_name(), e.emp_id, e.dept) for e in found[:len(scan_ids)]] != \
+            [(f'{e.f_name} {e.l_name}', e.emp_id, e.dept) for e in expected]:
+        logging.critical('The indexed Company found different employees than the list scan')
+        return 1
+    print(f'{"index":>12}: {elapsed * 1e6:10.2f}us (speedup {baseline / elapsed:.0f}x)')
+    start = time.perf_counter()
+    rows = table.find(lookup_ids)
+    elapsed = (time.perf_counter() - start) / len(lookup_ids)
+    if [table.row(row) for row in rows[:len(scan_ids)]] != found[:len(scan_ids)]:
+        logging.critical('EmployeeTable found different employees than the indexed Company')
+        return 1
+    print(f'{"columnar":>12}: {elapsed * 1e6:10.2f}us (speedup {baseline / elapsed:.0f}x, all ids at once)')
+
+    print('=' * 50)
+    print('Finding the employees of each department')
+    start = time.perf_counter()
+    expected = {dept: [e for e in original.employees if e.dept == dept] for dept in DEPTS}
+    baseline = time.perf_counter() - start
+    print(f'{"list scan":>12}: {baseline:8.3f}s')
+    start = time.perf_counter()
+    found = {dept: company.in_dept(dept) for dept in DEPTS}
+    elapsed = time.perf_counter() - start
+    if {dept: len(e) for dept, e in found.items()} != {dept: len(e) for dept, e in expected.items()}:
+        logging.critical('The indexed Company found different departments than the list scan')
+        return 1
+    print(f'{"index":>12}: {elapsed:8.3f}s (speedup {baseline / elapsed:.0f}x)')
+    start = time.perf_counter()
+    found = {dept: table.in_dept(dept) for dept in DEPTS}
+    elapsed = time.perf_counter() - start
+    if {dept: len(rows) for dept, rows in found.items()} != {dept: len(e) for dept, e in expected.items()}:
+        logging.critical('EmployeeTable found different departments than the list scan')
+        return 1
+    print(f'{"columnar":>12}: {elapsed:8.3f}s (speedup {baseline / elapsed:.0f}x)')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,30 +12,26 @@ environment you are running this script in.
 """
 
 import sys
-import argparse
 import logging
 import pathlib
 from data_class_module import Company, Employee
+from employee_io_module import iter_employees, write_employees
+from logging_module import setup_logging
+from startup_module import script_parser
 
-def main() -> 1:
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
-    args = parser.parse_args()
+    parser = script_parser('DEBUG', prog)
+    parser.add_argument('-e', '--employees_file', type=pathlib.Path, default=None,
+        help='Also add the employees of this file (.csv, .jsonl or .npz) to the company.')
+    parser.add_argument('-o', '--output_file', type=pathlib.Path, default=None,
+        help='Save the employees of the company to this file (.csv, .jsonl or .npz).')
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
 
     # --------------------------------------------------
     # Functionality starts here
@@ -47,9 +43,16 @@ def main() -> 1:
     print('Employee "c" changed her department:', c.dept)
     print('Same employee?:', b == c)
     comp = Company('FooBar', [a,b,c])
+    if args.employees_file:
+        # The file is streamed, one employee at a time
+        for emp in iter_employees(args.employees_file):
+            comp.add(emp)
     print('The company', comp.name, 'has these employees:')
     for emp in comp.employees:
         print(f'{emp.full_name()}: {emp.dept}')
+    if args.output_file:
+        count = write_employees(args.output_file, comp)
+        logging.info('Saved %d employees to %s', count, args.output_file)
 
     return 0
 
@@ -1,7 +1,13 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator, Sequence
 from dataclasses import dataclass
-from typing import List
+from startup_module import lazy_import
 
-@dataclass
+np = lazy_import('numpy')
+
+# slots=True stores the fields in fixed slots instead of a per-instance __dict__,
+# which makes each instance much smaller (see data_class_benchmark.py)
+@dataclass(slots=True)
 class Person:
     f_name: str
     l_name: str
@@ -10,7 +16,7 @@ class Person:
     def full_name(self) -> str:
         return(f'{self.f_name} {self.l_name}')
 
-@dataclass
+@dataclass(slots=True)
 class Employee(Person): # inheritance
     emp_id: int = 0
     dept: str = 'Unknown'
@@ -19,7 +25,209 @@ class Employee(Person): # inheritance
     def __eq__(self, other):
         return self.emp_id == other.emp_id
 
-@dataclass
+class EmployeesView(Sequence):
+    """
+    A read-only view of the employees of a Company (Company.employees), in
+    the order they were added. It compares equal to a list of the same
+    employees, but has no append, remove, etc, so changing it raises rather
+    than being lost: use Company.add and Company.remove, which keep the
+    indexes in sync. Indexing is O(n), iterate over it instead.
+    """
+
+    __slots__ = ('_records',)
+
+    def __init__(self, records: dict[int, Employee]):
+        self._records = records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Employee]:
+        return iter(self._records.values())
+
+    def __getitem__(self, index: int | slice) -> Employee | list[Employee]:
+        return list(self._records.values())[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, (EmployeesView, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
 class Company:
-    name: str
-    employees: List[Employee]
\ No newline at end of file
+    """
+    A company and its employees, with hash indexes on emp_id and dept, so
+    finding employees by either is O(1) rather than a scan of the list. The
+    indexes are kept in sync by add and remove, so change an employee's
+    emp_id or dept by removing it, updating it and adding it back.
+    employees is a read-only view (see EmployeesView).
+    NOTE: Like a list, a company can hold several records with the same
+    emp_id (e.g. an employee who changed department).
+    """
+
+    def __init__(self, name: str, employees: Iterable[Employee] = ()):
+        self.name = name
+        # The records, keyed by id(record), in the order they were added. A dict (unlike
+        # a list) removes a record in O(1), keeping the order
+        self._records = {}
+        # emp_id -> the record, or a list of the records when there are several
+        self._by_id = {}
+        # dept -> its records, keyed (and ordered) as in _records
+        self._by_dept = {}
+        for employee in employees:
+            self.add(employee)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(name={self.name!r}, employees={self.employees!r})'
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Employee]:
+        return iter(self._records.values())
+
+    def __contains__(self, employee: Employee) -> bool:
+        # Same as the 'in' of a list of employees, which compares emp_id
+        return employee.emp_id in self._by_id
+
+    def __eq__(self, other):
+        # As the original dataclass: the same name and equal employees, in order
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.name == other.name and self.employees == other.employees
+
+    @property
+    def employees(self) -> EmployeesView:
+        return EmployeesView(self._records)
+
+    def add(self, employee: Employee) -> None:
+        key = id(employee)
+        if key in self._records:
+            raise ValueError(f'{employee!r} is already in {self.name}')
+        self._records[key] = employee
+        records = self._by_id.get(employee.emp_id)
+        if records is None:
+            self._by_id[employee.emp_id] = employee
+        elif isinstance(records, list):
+            records.append(employee)
+        else:
+            self._by_id[employee.emp_id] = [records, employee]
+        self._by_dept.setdefault(employee.dept, {})[key] = employee
+
+    def remove(self, employee: Employee) -> None:
+        """
+        Remove employee, or (like list.remove) the first record with its emp_id
+        if employee itself isn't in the company.
+        """
+        records = self.find_all(employee.emp_id)
+        if not records:
+            raise ValueError(f'{employee!r} is not in {self.name}')
+        employee = next((record for record in records if record is employee), records[0])
+        key = id(employee)
+        del self._records[key]
+        records = [record for record in records if record is not employee]
+        if not records:
+            del self._by_id[employee.emp_id]
+        else:
+            self._by_id[employee.emp_id] = records if len(records) > 1 else records[0]
+        dept = self._by_dept[employee.dept]
+        del dept[key]
+        if not dept:
+            del self._by_dept[employee.dept]
+
+    def find(self, emp_id: int) -> Employee | None:
+        """The first record with emp_id, or None."""
+        records = self._by_id.get(emp_id)
+        return records[0] if isinstance(records, list) else records
+
+    def find_all(self, emp_id: int) -> list[Employee]:
+        records = self._by_id.get(emp_id)
+        if records is None:
+            return []
+        return list(records) if isinstance(records, list) else [records]
+
+    def in_dept(self, dept: str) -> list[Employee]:
+        return list(self._by_dept.get(dept, {}).values())
+
+    @property
+    def depts(self) -> list[str]:
+        return list(self._by_dept)
+
+class EmployeeTable:
+    """
+    A read-only, columnar (array-backed) store of employees, for bulk loading
+    and analytics over millions of records. Each field is one NumPy array:
+    the numbers are int32/int64 arrays, dept is stored as codes into the
+    list of departments, and only the names are Python strings. The arrays
+    take less than half the memory of the Employee objects (about 46 bytes a
+    row, with the emp_id index, see data_class_benchmark.py), and whole-table
+    operations are vectorized. Rows are looked up by emp_id through a sorted copy of
+    the ids (O(log n), no per-row Python objects). Use row (or Company) when
+    Employee objects are needed.
+    """
+
+    def __init__(self, f_name: np.ndarray, l_name: np.ndarray, age: np.ndarray, emp_id: np.ndarray,
+            dept_codes: np.ndarray, depts: list[str]):
+        self.f_name = f_name
+        self.l_name = l_name
+        self.age = age
+        self.emp_id = emp_id
+        self.dept_codes = dept_codes
+        self.depts = depts
+        # The stable sort keeps the rows of an emp_id in their original order
+        self._id_order = np.argsort(emp_id, kind='stable')
+        self._sorted_ids = emp_id[self._id_order]
+
+    @classmethod
+    def from_employees(cls, employees: Iterable[Employee]) -> 'EmployeeTable':
+        employees = list(employees)
+        dept_index = {}
+        dept_codes = np.fromiter((dept_index.setdefault(e.dept, len(dept_index)) for e in employees),
+            dtype=np.int32, count=len(employees))
+        return cls(np.array([e.f_name for e in employees], dtype=object),
+            np.array([e.l_name for e in employees], dtype=object),
+            np.fromiter((e.age for e in employees), dtype=np.int32, count=len(employees)),
+            np.fromiter((e.emp_id for e in employees), dtype=np.int64, count=len(employees)),
+            dept_codes, list(dept_index))
+
+    def __len__(self) -> int:
+        return len(self.emp_id)
+
+    def row(self, index: int) -> Employee:
+        return Employee(self.f_name[index], self.l_name[index], int(self.age[index]), int(self.emp_id[index]),
+            self.depts[self.dept_codes[index]])
+
+    def to_employees(self) -> list[Employee]:
+        # tolist converts whole columns to Python objects, much faster than row by row
+        depts = np.array(self.depts, dtype=object)[self.dept_codes]
+        return list(map(Employee, self.f_name.tolist(), self.l_name.tolist(), self.age.tolist(),
+            self.emp_id.tolist(), depts.tolist()))
+
+    def find(self, emp_id: int | np.ndarray) -> int | np.ndarray:
+        """
+        The row of the first record with emp_id, or -1. emp_id can also be an
+        array of ids, to look them all up at once.
+        """
+        emp_id = np.asarray(emp_id)
+        if not len(self):
+            return np.full(emp_id.shape, -1) if emp_id.ndim else -1
+        # The leftmost match is the first record (see _id_order)
+        position = np.minimum(np.searchsorted(self._sorted_ids, emp_id), len(self) - 1)
+        rows = np.where(self._sorted_ids[position] == emp_id, self._id_order[position], -1)
+        return rows if rows.ndim else int(rows)
+
+    def in_dept(self, dept: str) -> np.ndarray:
+        """The rows of the employees in dept."""
+        if dept not in self.depts:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.dept_codes == self.depts.index(dept))
+
+    def dept_counts(self) -> dict[str, int]:
+        return dict(zip(self.depts, np.bincount(self.dept_codes, minlength=len(self.depts)).tolist()))
+
+    def mean_age_by_dept(self) -> dict[str, float]:
+        counts = np.bincount(self.dept_codes, minlength=len(self.depts))
+        totals = np.bincount(self.dept_codes, self.age, minlength=len(self.depts))
+        return {dept: total / count for dept, total, count in zip(self.depts, totals.tolist(), counts.tolist())}
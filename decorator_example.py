@@ -3,23 +3,38 @@
 File name: decorator_example.py
 Description: A simple template for implementing decorator functions. It
     prints a random list of numbers (each from 1-10) but the decorator
-    ensures the numbers can only be odd.
+    ensures the numbers can only be odd. With --batch, the numbers are
+    drawn all at once with NumPy, by the batch versions of the decorator
+    and function.
 Author: Chris Zaleski
 Python Version: 3.x
 Date: 2022-11-04
 """
 
+from __future__ import annotations
 import sys
-import argparse
+import functools
 import logging
 import pathlib
 import random
+from logging_module import setup_logging
+from profiling_module import count_event, counted, enable, timed
+from startup_module import lazy_import, script_parser
+
+np = lazy_import('numpy')
+
+@functools.cache
+def batch_rng() -> np.random.Generator:
+    """The random number generator of the batch functions, created (with NumPy) on first use."""
+    return np.random.default_rng()
 
 def only_odd(func):
     """
     Type hinting is not used here because of unknown compatibility
         with decorators (implemented in 3.10?)
     """
+    # wraps gives odd_func the name (and docstring) of func
+    @functools.wraps(func)
     def odd_func(*args, **kwargs):
         while True:
             result = func(*args, **kwargs)
@@ -28,10 +43,14 @@ def only_odd(func):
                 break
             else:
                 logging.info('@decorated: It\'s even! Throw it away!')
+                count_event('only_odd.rejected')
         return result
     return odd_func
 
+# timed measures each odd number, counted each draw (including the rejected ones)
+@timed
 @only_odd
+@counted(name='get_a_number.draws')
 def get_a_number() -> int:
     """
     Returns a random integer from 1 to 10.
@@ -42,36 +61,83 @@ def get_a_number() -> int:
         Random integer.
     """
     num = random.randint(1, 10)
-    logging.info(f'Got number: {str(num)}')
+    logging.info('Got number: %d', num)
     return num
 
-def main() -> 1:
+def only_odd_batch(func):
+    """
+    The batch version of only_odd, for a function that returns an array of
+    size random numbers, func(size). Even numbers are rejected all at once,
+    and only their slots are drawn again (in one call per round), until
+    every number is odd. Each slot is drawn until it is odd, exactly as
+    with only_odd, so the numbers have the same distribution.
+    """
+    @functools.wraps(func)
+    def odd_func(size, *args, **kwargs):
+        result = func(size, *args, **kwargs)
+        rejected = np.flatnonzero(result % 2 == 0)
+        while rejected.size:
+            logging.info('@decorated: %d of them are even! Throw them away!', rejected.size)
+            count_event('only_odd_batch.rejected', rejected.size)
+            result[rejected] = func(rejected.size, *args, **kwargs)
+            rejected = rejected[result[rejected] % 2 == 0]
+        logging.info('@decorated: They\'re all odd! I love odd numbers!')
+        return result
+    return odd_func
+
+@timed
+@only_odd_batch
+@counted(name='get_numbers.draws')
+def get_numbers(size: int) -> np.ndarray:
+    """
+    Returns random integers from 1 to 10.
+
+    Parameters
+    ----------
+    size : int
+        The number of integers.
+
+    Returns
+    -------
+    np.ndarray
+        Random integers.
+    """
+    nums = batch_rng().integers(1, 10, size=size, endpoint=True)
+    logging.info('Got %d numbers', size)
+    return nums
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
+    parser = script_parser('DEBUG', prog)
     parser.add_argument('-t', '--total_numbers', type=int, default=5,
         help='The total random numbers you want.')
-    args = parser.parse_args()
+    parser.add_argument('-b', '--batch', action='store_true',
+        help='Draw all the numbers at once (with NumPy), rather than one at a time.')
+    parser.add_argument('--profile', type=pathlib.Path, default=None,
+        help='Write the call counts and timings of the decorated functions to this JSON file on exit.')
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+    # --------------------------------------------------
+    # Additional argument validation (if necessary)
+    if args.total_numbers < 0:
+        logging.critical('--total_numbers cannot be negative')
+        return 1
+
+    if args.profile:
+        enable(args.profile)
 
     # --------------------------------------------------
     # Functionality starts here
-    odds_only = []
-    for t in range(args.total_numbers):
-        odds_only.append(get_a_number())
+    if args.batch:
+        odds_only = get_numbers(args.total_numbers).tolist()
+    else:
+        odds_only = []
+        for t in range(args.total_numbers):
+            odds_only.append(get_a_number())
     print('Here\'s my final list of numbers:')
     print(odds_only)
     
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+File name: employee_io_benchmark.py
+Description: Times round-tripping a generated Company through the csv,
+    JSON lines and binary (.npz) formats of employee_io_module.py, as
+    Employee objects and as the columnar EmployeeTable, and measures the
+    peak memory of streaming one file into another. Every round trip is
+    checked to return the same employees.
+Python Version: 3.x
+"""
+
+import sys
+import logging
+import multiprocessing
+import pathlib
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from data_class_benchmark import make_records
+from data_class_module import Company, Employee, EmployeeTable
+from employee_io_module import iter_employees, load_company, read_table, write_employees, write_table
+from logging_module import setup_logging
+from startup_module import script_parser
+
+def same_employees(a, b) -> bool:
+    """Compare two sequences of employees field by field (Employee == only compares emp_id)."""
+    fields = lambda e: (e.f_name, e.l_name, e.age, e.emp_id, e.dept)
+    return len(a) == len(b) and all(fields(x) == fields(y) for x, y in zip(a, b))
+
+def stream_copy(source: pathlib.Path, target: pathlib.Path) -> tuple[int, float, float]:
+    """
+    Stream the employees of source into target, and return the number of
+    employees, the time taken and the peak memory (RSS, in MB) of the process.
+    Run it in a new process, so the peak only reflects the copy.
+    """
+    start = time.perf_counter()
+    count = write_employees(target, iter_employees(source))
+    elapsed = time.perf_counter() - start
+    try:
+        # On Linux, ru_maxrss carries over the parent's peak through exec, VmHWM doesn't
+        with open('/proc/self/status') as f:
+            peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        # ru_maxrss is in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024**2 if sys.platform == 'darwin' else 1024)
+    return count, elapsed, peak
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-n', '--num_employees', type=int, default=5_000_000,
+        help='The number of employees in the generated company.')
+    parser.add_argument('-t', '--temp_dir', type=pathlib.Path, default=None,
+        help='Where to write the files. By default, a new temporary directory that is deleted when finished.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    company = Company('FooBar', (Employee(*record) for record in make_records(args.num_employees)))
+    employees = company.employees
+    logging.info('Generated a company of %d employees', len(company))
+    temp_dir = args.temp_dir or pathlib.Path(tempfile.mkdtemp(prefix='employee_io_benchmark_'))
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        print('=' * 50)
+        print(f'Round trip of {len(company)} Employee objects (write, read)')
+        for file_format in ('csv', 'jsonl', 'npz'):
+            data_file = temp_dir / f'employees.{file_format}'
+            start = time.perf_counter()
+            write_employees(data_file, company)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = load_company('FooBar', data_file)
+            read = time.perf_counter() - start
+            if not same_employees(loaded.employees, employees):
+                logging.critical('The %s round trip changed the employees', file_format)
+                return 1
+            del loaded
+            size = data_file.stat().st_size / 1024**2
+            print(f'{file_format:>12}: {written:6.2f}s, {read:6.2f}s ({size:.0f} MB)')
+
+        print('=' * 50)
+        print(f'Round trip of a {len(company)} row EmployeeTable (write, read)')
+        table = EmployeeTable.from_employees(employees)
+        for file_format in ('csv', 'jsonl', 'npz'):
+            data_file = temp_dir / f'table.{file_format}'
+            start = time.perf_counter()
+            write_table(data_file, table)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = read_table(data_file)
+            read = time.perf_counter() - start
+            if not same_employees(loaded.to_employees(), employees):
+                logging.critical('The %s table round trip changed the employees', file_format)
+                return 1
+            del loaded
+            print(f'{file_format:>12}: {written:6.2f}s, {read:6.2f}s')
+        del table
+
+        print('=' * 50)
+        print('Streaming csv to JSON lines, one employee at a time, in a new process (time, peak memory)')
+        # 'spawn' starts a fresh interpreter, rather than a copy of this (large) process
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            count, elapsed, peak = executor.submit(stream_copy, temp_dir / 'employees.csv',
+                temp_dir / 'copy.jsonl').result()
+        print(f'{count} employees in {elapsed:.2f}s, peak {peak:.0f} MB')
+    finally:
+        if not args.temp_dir:
+            shutil.rmtree(temp_dir)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+from __future__ import annotations
+import contextlib
+import csv
+import gc
+import itertools
+import json
+import operator
+import pathlib
+from collections.abc import Iterable, Iterator
+from dataclasses import fields
+from data_class_module import Company, Employee, EmployeeTable
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+
+# The columns of the files, in the order of the Employee fields
+FIELDS = tuple(f.name for f in fields(Employee))
+# Pulls the fields of an Employee as a tuple, much faster than dataclasses.astuple
+_employee_fields = operator.attrgetter(*FIELDS)
+# The rows parsed (or written) at a time. Memory use only depends on this, not on the file size.
+CHUNK_ROWS = 10_000
+# Quotes a string exactly as json.dumps does, without the overhead of a json.dumps call per value
+_json_string = json.encoder.encode_basestring_ascii
+# Separates the strings of a column in the binary format. It can't be part of a name.
+_SEPARATOR = '\0'
+
+def _file_format(path: pathlib.Path) -> str:
+    file_format = pathlib.Path(path).suffix.lower().lstrip('.')
+    if file_format not in ('csv', 'jsonl', 'npz'):
+        raise ValueError(f'Unsupported employee file format: {path} (use .csv, .jsonl or .npz)')
+    return file_format
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Building millions of objects triggers many garbage collection passes, each slower than
+    # the last as the heap grows, and pointless here since the new objects hold no cycles
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _read_rows(path: pathlib.Path, file_format: str, chunk_rows: int) -> Iterator[list[tuple]]:
+    # Yields lists of (f_name, l_name, age, emp_id, dept) rows from a csv or JSON lines file
+    with open(path, newline='' if file_format == 'csv' else None, encoding='utf-8') as f:
+        if file_format == 'csv':
+            reader = csv.reader(f)
+            columns = next(reader, None)
+            if columns is not None and tuple(columns) != FIELDS:
+                raise ValueError(f'{path} has columns {columns}, expected {list(FIELDS)}')
+            while chunk := list(itertools.islice(reader, chunk_rows)):
+                yield [(f_name, l_name, int(age), int(emp_id), dept) for f_name, l_name, age, emp_id, dept in chunk]
+        else:
+            while lines := list(itertools.islice(f, chunk_rows)):
+                # One json.loads call parses the whole chunk
+                records = json.loads('[' + ','.join(line for line in lines if line.strip()) + ']')
+                yield [(r['f_name'], r['l_name'], int(r['age']), int(r['emp_id']), r['dept']) for r in records]
+
+def _write_rows(path: pathlib.Path, file_format: str, rows: Iterable[tuple]) -> int:
+    # Writes (f_name, l_name, age, emp_id, dept) rows to a csv or JSON lines file
+    count = 0
+    with open(path, 'w', newline='' if file_format == 'csv' else None, encoding='utf-8') as f:
+        if file_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            # writerows on chunks of rows avoids a Python call per row
+            while chunk := list(itertools.islice(rows, CHUNK_ROWS)):
+                writer.writerows(chunk)
+                count += len(chunk)
+        else:
+            # The same lines as json.dumps(dict(zip(FIELDS, row)))
+            for count, (f_name, l_name, age, emp_id, dept) in enumerate(rows, start=1):
+                f.write(f'{{"f_name": {_json_string(f_name)}, "l_name": {_json_string(l_name)}, "age": {age:d}, '
+                    f'"emp_id": {emp_id:d}, "dept": {_json_string(dept)}}}\n')
+    return count
+
+def iter_employees(path: pathlib.Path) -> Iterator[Employee]:
+    """
+    Stream the employees of a file, CHUNK_ROWS rows at a time, so the file is
+    never held in memory. The format is taken from the suffix: '.csv' (with
+    a header row), '.jsonl' (JSON lines, one object per employee) or '.npz'
+    (the binary format of write_table, which is loaded whole).
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to read.
+
+    Yields
+    ------
+    Employee
+        The employees, in file order.
+    """
+    file_format = _file_format(path)
+    if file_format == 'npz':
+        yield from read_table(path).to_employees()
+        return
+    for rows in _read_rows(path, file_format, CHUNK_ROWS):
+        yield from itertools.starmap(Employee, rows)
+
+def load_company(name: str, path: pathlib.Path) -> Company:
+    """The Company with the employees of a file (see iter_employees)."""
+    with _gc_paused():
+        return Company(name, iter_employees(path))
+
+def write_employees(path: pathlib.Path, employees: Iterable[Employee]) -> int:
+    """
+    Write employees (e.g. a Company) to a file, in the format given by its
+    suffix (see iter_employees). Rows are written as they are produced, so
+    employees can be a generator over more records than fit in memory,
+    except for the '.npz' format, which is written from an EmployeeTable.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to write.
+    employees : Iterable[Employee]
+        The employees to write.
+
+    Returns
+    -------
+    int
+        The number of employees written.
+    """
+    file_format = _file_format(path)
+    if file_format == 'npz':
+        table = EmployeeTable.from_employees(employees)
+        write_table(path, table)
+        return len(table)
+    return _write_rows(path, file_format, map(_employee_fields, employees))
+
+def _join_strings(strings: Iterable[str]) -> np.ndarray:
+    return np.frombuffer(_SEPARATOR.join(strings).encode('utf-8'), dtype=np.uint8)
+
+def _split_strings(blob: np.ndarray, count: int) -> np.ndarray:
+    strings = np.empty(count, dtype=object)
+    if count:
+        strings[:] = blob.tobytes().decode('utf-8').split(_SEPARATOR)
+    return strings
+
+def read_table(path: pathlib.Path, chunk_rows: int = 100_000) -> EmployeeTable:
+    """
+    Read a file into the columnar EmployeeTable, without creating an
+    Employee per row. A csv or JSON lines file is parsed chunk_rows rows at
+    a time, so only the columns being built (not the file) are held in
+    memory.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to read (see iter_employees for the formats).
+    chunk_rows : int
+        The rows parsed at a time.
+
+    Returns
+    -------
+    EmployeeTable
+        The employees, in file order.
+    """
+    file_format = _file_format(path)
+    with _gc_paused():
+        return _read_table(path, file_format, chunk_rows)
+
+def _read_table(path: pathlib.Path, file_format: str, chunk_rows: int) -> EmployeeTable:
+    if file_format == 'npz':
+        with np.load(path) as data:
+            count = len(data['emp_id'])
+            return EmployeeTable(_split_strings(data['f_name'], count), _split_strings(data['l_name'], count),
+                data['age'], data['emp_id'], data['dept_codes'],
+                _split_strings(data['depts'], int(data['dept_count'])).tolist())
+    columns = {'f_name': [], 'l_name': [], 'age': [], 'emp_id': [], 'dept_codes': []}
+    dept_index = {}
+    for rows in _read_rows(path, file_format, chunk_rows):
+        if not rows:
+            # A chunk of blank JSON lines
+            continue
+        f_name, l_name, age, emp_id, dept = zip(*rows)
+        columns['f_name'].append(np.array(f_name, dtype=object))
+        columns['l_name'].append(np.array(l_name, dtype=object))
+        columns['age'].append(np.array(age, dtype=np.int32))
+        columns['emp_id'].append(np.array(emp_id, dtype=np.int64))
+        columns['dept_codes'].append(np.fromiter((dept_index.setdefault(d, len(dept_index)) for d in dept),
+            dtype=np.int32, count=len(dept)))
+    dtypes = {'f_name': object, 'l_name': object, 'age': np.int32, 'emp_id': np.int64, 'dept_codes': np.int32}
+    return EmployeeTable(**{name: np.concatenate(arrays) if arrays else np.empty(0, dtype=dtypes[name])
+        for name, arrays in columns.items()}, depts=list(dept_index))
+
+def write_table(path: pathlib.Path, table: EmployeeTable) -> None:
+    """
+    Write an EmployeeTable to a file. The '.npz' format is a compact binary
+    format: the numeric columns as they are, and each text column as one
+    block of UTF-8 text, which is much faster to write and read than text
+    formats.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to write (see iter_employees for the formats).
+    table : EmployeeTable
+        The employees to write.
+    """
+    file_format = _file_format(path)
+    if file_format == 'npz':
+        # No compression: it would save little on the numbers, and slow both ways
+        np.savez(path, f_name=_join_strings(table.f_name), l_name=_join_strings(table.l_name), age=table.age,
+            emp_id=table.emp_id, dept_codes=table.dept_codes, depts=_join_strings(table.depts),
+            dept_count=np.int64(len(table.depts)))
+        return
+    depts = np.array(table.depts, dtype=object)
+    rows = itertools.chain.from_iterable(
+        # tolist converts a chunk of each column to Python objects at once
+        zip(table.f_name[chunk].tolist(), table.l_name[chunk].tolist(), table.age[chunk].tolist(),
+            table.emp_id[chunk].tolist(), depts[table.dept_codes[chunk]].tolist())
+        for chunk in (slice(start, start + CHUNK_ROWS) for start in range(0, len(table), CHUNK_ROWS)))
+    _write_rows(path, file_format, rows)
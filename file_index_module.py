@@ -0,0 +1,240 @@
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+from collections.abc import Iterator
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent_id INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent_id);
+CREATE TABLE IF NOT EXISTS files (
+    dir_id INTEGER NOT NULL REFERENCES dirs (id) ON DELETE CASCADE,
+    pos INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir_id);
+-- A trigram index of the file names, so a search for a substring of a name only reads the
+-- files that contain it (kept in sync with files by the triggers)
+CREATE VIRTUAL TABLE IF NOT EXISTS file_names USING fts5(name, content='files', content_rowid='rowid',
+    tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+    INSERT INTO file_names (rowid, name) VALUES (new.rowid, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+    INSERT INTO file_names (file_names, rowid, name) VALUES ('delete', old.rowid, old.name);
+END;
+-- When the tree below each path was last checked for changes
+CREATE TABLE IF NOT EXISTS refreshes (
+    path TEXT PRIMARY KEY,
+    time REAL NOT NULL
+);
+'''
+# Stored as the user_version of the index file. Indexes of an older version are upgraded when opened.
+_SCHEMA_VERSION = 1
+# The shortest search string the trigram index can answer. Shorter ones are matched against every name.
+_TRIGRAM = 3
+
+def _subtree_bounds(path: str) -> tuple[str, str]:
+    # Every path below 'path' sorts between 'path/' and 'path0' ('0' follows '/' in ASCII)
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+class FileIndex:
+    """
+    An on-disk (SQLite) index of directory -> (file name, mtime, size) entries.
+
+    A refresh only rescans the directories whose own mtime changed since they
+    were indexed. NOTE: A directory's mtime changes when files are added,
+    removed or renamed in it, but not when an existing file is rewritten in
+    place, so the mtime/size of such a file stays stale until its directory
+    changes. As with file_search.find_files, symlinked directories are not
+    descended into. Checking for changes stats every indexed directory, so
+    with max_age (see refresh) queries skip it if it was done recently, and
+    may miss the changes since.
+    """
+
+    def __init__(self, index_file: pathlib.Path):
+        self.connection = sqlite3.connect(index_file)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        self.connection.executescript(_SCHEMA)
+        if version < _SCHEMA_VERSION:
+            with self.connection:
+                # Index the names of the files indexed before there was a file_names table
+                self.connection.execute("INSERT INTO file_names (file_names) VALUES ('rebuild')")
+                self.connection.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+
+    def __enter__(self) -> 'FileIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _dir_id(self, path: str, parent_id: int | None) -> tuple[int, int | None]:
+        """Return the id and indexed mtime of a directory, adding it if necessary."""
+        row = self.connection.execute('SELECT id, parent_id, mtime_ns FROM dirs WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            cursor = self.connection.execute('INSERT INTO dirs (path, parent_id) VALUES (?, ?)', (path, parent_id))
+            return cursor.lastrowid, None
+        if parent_id is not None and row[1] != parent_id:
+            self.connection.execute('UPDATE dirs SET parent_id = ? WHERE id = ?', (parent_id, row[0]))
+        return row[0], row[2]
+
+    def _remove_subtree(self, path: str) -> None:
+        low, high = _subtree_bounds(path)
+        self.connection.execute('DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)', (path, low, high))
+
+    def _rescan(self, path: str, dir_id: int, mtime_ns: int) -> list[str]:
+        """Replace the indexed files of a directory. Return its subdirectories."""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files.append((dir_id, len(files), entry.name, stat.st_mtime_ns, stat.st_size))
+                    except OSError as err:
+                        logging.debug('Skipping %s: %s', entry.path, err)
+        except OSError as err:
+            logging.warning('Unable to scan directory %s: %s', path, err)
+            # Leave the mtime unset so the directory is retried on the next refresh
+            mtime_ns = None
+        self.connection.execute('DELETE FROM files WHERE dir_id = ?', (dir_id,))
+        self.connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)', files)
+        # Drop the subdirectories that no longer exist (or were replaced by a symlink)
+        keep = set(subdirs)
+        for (child,) in self.connection.execute('SELECT path FROM dirs WHERE parent_id = ?', (dir_id,)).fetchall():
+            if child not in keep:
+                self._remove_subtree(child)
+        self.connection.execute('UPDATE dirs SET mtime_ns = ? WHERE id = ?', (mtime_ns, dir_id))
+        return subdirs
+
+    def refresh(self, search_dir: pathlib.Path, max_age: float | None = None) -> None:
+        """
+        Bring the index for search_dir (and everything below it) up to date.
+        This stats every indexed directory, and rescans the ones that changed.
+
+        Parameters
+        ----------
+        search_dir : pathlib.Path
+            The directory to index.
+        max_age : float | None
+            Skip the refresh if search_dir (or a directory above it) was
+            refreshed less than this many seconds ago. None always refreshes.
+        """
+        root = os.path.abspath(search_dir)
+        started = time.time()
+        if max_age is not None:
+            last = self.last_refresh(root)
+            if last is not None and started - last < max_age:
+                logging.info('Index refreshed %.0fs ago, not checking for changes', started - last)
+                return
+        rescanned = 0
+        with self.connection:
+            # The indexed directories (and their subdirectories) in one query, rather than one per directory
+            low, high = _subtree_bounds(root)
+            indexed = {}
+            children = {}
+            for dir_id, path, parent_id, mtime_ns in self.connection.execute(
+                    'SELECT id, path, parent_id, mtime_ns FROM dirs WHERE path = ? OR (path >= ? AND path < ?)',
+                    (root, low, high)):
+                indexed[path] = (dir_id, parent_id, mtime_ns)
+                children.setdefault(parent_id, []).append(path)
+            stack = [(root, None)]
+            while stack:
+                path, parent_id = stack.pop()
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    self._remove_subtree(path)
+                    continue
+                if path in indexed and (parent_id is None or indexed[path][1] == parent_id):
+                    dir_id, _, indexed_mtime_ns = indexed[path]
+                else:
+                    dir_id, indexed_mtime_ns = self._dir_id(path, parent_id)
+                if mtime_ns == indexed_mtime_ns:
+                    subdirs = children.get(dir_id, [])
+                else:
+                    subdirs = self._rescan(path, dir_id, mtime_ns)
+                    rescanned += 1
+                stack.extend((subdir, dir_id) for subdir in subdirs)
+            self.connection.execute('INSERT OR REPLACE INTO refreshes VALUES (?, ?)', (root, started))
+        logging.info('Index refreshed: %d directories rescanned', rescanned)
+
+    def last_refresh(self, search_dir: pathlib.Path) -> float | None:
+        """The time search_dir (or a directory above it) was last refreshed, or None if it never was."""
+        root = os.path.abspath(search_dir)
+        last = None
+        for path, refreshed in self.connection.execute('SELECT path, time FROM refreshes'):
+            if (root == path or root.startswith(_subtree_bounds(path)[0])) and (last is None or refreshed > last):
+                last = refreshed
+        return last
+
+    def query(self, search_dir: pathlib.Path, search_string: str, newest_only: bool = False) -> Iterator[str]:
+        """
+        Yield the indexed files below search_dir whose name contains
+        search_string (ignoring ASCII case, like file_search.iter_files),
+        ordered by directory path and then by directory listing order. A
+        search string of at least 3 characters is looked up in the trigram
+        index of the names, so only the matching files are read. A shorter
+        one is compared with every name, in SQLite.
+
+        Parameters
+        ----------
+        search_dir : pathlib.Path
+            The directory to start searching.
+        search_string : str
+            The string to match in the file name. An empty string matches every file.
+        newest_only : bool
+            For each directory, only return the file with the latest modified timestamp.
+
+        Yields
+        ------
+        str
+            A matching file path, relative or absolute like search_dir.
+        """
+        root = os.path.abspath(search_dir)
+        # Paths are stored absolute, but reported relative to search_dir as given
+        display_root = str(pathlib.Path(search_dir))
+        if display_root == os.curdir:
+            display_root = ''
+        where = '(d.path = ? OR (d.path >= ? AND d.path < ?))'
+        params = [root, *_subtree_bounds(root)]
+        if len(search_string) >= _TRIGRAM:
+            # A quoted phrase of trigrams matches the names that contain it
+            where += ' AND f.rowid IN (SELECT rowid FROM file_names WHERE file_names MATCH ?)'
+            params.append('"' + search_string.replace('"', '""') + '"')
+        elif search_string:
+            where += ' AND instr(lower(f.name), ?) > 0'
+            params.append(search_string.lower())
+        if newest_only:
+            # Like find_files, the first file listed wins a tie on mtime
+            sql = f'''
+                SELECT path, name FROM (
+                    SELECT d.path, f.name, f.pos, ROW_NUMBER() OVER (PARTITION BY f.dir_id
+                        ORDER BY f.mtime_ns DESC, f.pos) AS newest
+                    FROM files f JOIN dirs d ON d.id = f.dir_id WHERE {where})
+                WHERE newest = 1 ORDER BY path, pos
+            '''
+        else:
+            sql = f'SELECT d.path, f.name FROM files f JOIN dirs d ON d.id = f.dir_id WHERE {where} ORDER BY d.path, f.pos'
+        for path, name in self.connection.execute(sql, params):
+            relative = path[len(root):].lstrip(os.sep)
+            yield os.path.join(display_root, relative, name)
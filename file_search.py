@@ -4,20 +4,149 @@ File name: file_search.py
 Description: Performs a simple file search given a starting directory and 
     a search string. Can optionally return only the newest file (latest modified 
     timestamp) in a directory if multiple files are found within that directory.
+    With --content, the search string is matched against the file contents
+    instead, and each match is reported as file:line:offset.
 Author: Chris Zaleski
 Python Version: 3.x
 Date: 2022-11-03
 """
 
 import sys
-import argparse
+import itertools
 import logging
+import mmap
+import os
 import pathlib
 import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from file_index_module import FileIndex
+from logging_module import setup_logging
+from startup_module import script_parser
 
-def find_files(search_dir: pathlib.Path, search_string: str, newest_only: bool = False) -> list[str]:
+# The directories scanned ahead of the output by each thread of a threaded walk
+LOOKAHEAD = 4
+
+def _scan_dir(dir_path: str, file_match: re.Pattern, newest_only: bool = False) -> tuple[list[str], list[str]]:
     """
-    Search for file containing search_string. Return a list of file names.
+    Scan a single directory with os.scandir. Return the matching files and
+    the subdirectories to descend into.
+
+    Parameters
+    ----------
+    dir_path : str
+        The directory to scan. An empty string means the current directory.
+    file_match : re.Pattern
+        The compiled pattern to match against each file name.
+    newest_only : bool
+        Only return the matching file with the latest modified timestamp.
+
+    Returns
+    -------
+    tuple[list[str], list[str]]
+        The matching file paths and the subdirectory paths, both in scandir order.
+    """
+    matches = []
+    subdirs = []
+    latest_file = None
+    latest_mtime = None
+    try:
+        with os.scandir(dir_path or os.curdir) as entries:
+            for entry in entries:
+                # Mirror pathlib's relative paths for the current directory ('a', not './a')
+                path = entry.path if dir_path else entry.name
+                try:
+                    # Like pathlib's glob, symlinked directories are not descended into
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(path)
+                        continue
+                    if not entry.is_file() or not file_match.search(entry.name):
+                        continue
+                    if newest_only:
+                        # DirEntry caches the stat result, so each file is stat'ed at most once
+                        mtime = entry.stat().st_mtime
+                        if latest_file is None or mtime > latest_mtime:
+                            latest_file, latest_mtime = path, mtime
+                    else:
+                        matches.append(path)
+                except OSError as err:
+                    # The entry may have been removed or changed since it was listed
+                    logging.debug('Skipping %s: %s', path, err)
+    except OSError as err:
+        logging.warning('Unable to scan directory %s: %s', dir_path or os.curdir, err)
+    if latest_file is not None:
+        matches.append(latest_file)
+
+    return matches, subdirs
+
+def _walk_matches(search_dir: pathlib.Path, file_match: re.Pattern, newest_only: bool = False,
+        workers: int = 1) -> Iterator[list[str]]:
+    """
+    Walk search_dir top-down and yield the matching files of each directory.
+    Directories are yielded in the same order as pathlib's glob('**/'), even
+    when they are scanned in parallel.
+
+    Parameters
+    ----------
+    search_dir : pathlib.Path
+        The directory to start searching.
+    file_match : re.Pattern
+        The compiled pattern to match against each file name.
+    newest_only : bool
+        For each directory, only return the file with the latest modified timestamp.
+    workers : int
+        The number of threads used to scan directories. 1 scans in the calling thread.
+
+    Yields
+    ------
+    list[str]
+        The matching file paths of one directory.
+    """
+    root = str(pathlib.Path(search_dir))
+    if root == os.curdir:
+        root = ''
+    if not os.path.isdir(root or os.curdir):
+        return
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            matches, subdirs = _scan_dir(stack.pop(), file_match, newest_only)
+            stack.extend(reversed(subdirs))
+            yield matches
+        return
+
+    # Only the next directories to be yielded are scanned ahead, at most LOOKAHEAD per thread,
+    # so the outstanding scans (and their results) stay bounded however wide the tree is
+    window = workers * LOOKAHEAD
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # Consume depth-first so the output order matches the serial walk. The stack holds
+        # the directories not scanned yet (str) and those being scanned ahead (Future),
+        # the next one to yield on top.
+        stack: list[str | Future] = [root]
+        outstanding = 0
+        while stack:
+            # Submit the directories nearest the top, until the window is full
+            i = len(stack) - 1
+            while i >= 0 and outstanding < window:
+                if isinstance(stack[i], str):
+                    stack[i] = executor.submit(_scan_dir, stack[i], file_match, newest_only)
+                    outstanding += 1
+                i -= 1
+            matches, subdirs = stack.pop().result()
+            outstanding -= 1
+            stack.extend(reversed(subdirs))
+            yield matches
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def iter_files(search_dir: pathlib.Path, search_string: str, newest_only: bool = False,
+        workers: int = 1, index: pathlib.Path | None = None, refresh: bool = True,
+        limit: int | None = None, max_age: float | None = None) -> Iterator[str]:
+    """
+    Search for files containing search_string. Yield each file name as soon
+    as it is found. Closing the generator early stops the search.
 
     Parameters
     ----------
@@ -27,71 +156,260 @@ def find_files(search_dir: pathlib.Path, search_string: str, newest_only: bool =
         The string to match in the file name.
     newest_only : bool
         For each directory, only return the file with the latest modified timestamp.
+    workers : int
+        The number of threads used to scan directories.
+    index : pathlib.Path | None
+        Answer the search from this on-disk index (see file_index_module) instead
+        of walking the tree. The index file is created if it does not exist.
+    refresh : bool
+        When using an index, first rescan the directories that changed since the
+        last run. If False, the index is queried as is.
+    limit : int | None
+        Stop after this many files. None means no limit.
+    max_age : float | None
+        When using an index, only refresh it if it was last refreshed more than
+        this many seconds ago (see FileIndex.refresh). None always refreshes.
+
+    Yields
+    ------
+    str
+        A file name string.
+    """
+    if limit is not None and limit < 1:
+        return
+    found = 0
+    if index:
+        with FileIndex(index) as file_index:
+            if refresh:
+                file_index.refresh(search_dir, max_age)
+            for file in file_index.query(search_dir, search_string, newest_only):
+                yield file
+                found += 1
+                if found == limit:
+                    return
+        return
+    file_match = re.compile(re.escape(search_string), re.IGNORECASE)
+    # directories are scanned one at a time (required for 'newest_only' functionality)
+    walk = _walk_matches(search_dir, file_match, newest_only, workers)
+    try:
+        for matches in walk:
+            for file in matches:
+                yield file
+                found += 1
+                if found == limit:
+                    return
+    finally:
+        # Stops the scanning threads right away on an early exit
+        walk.close()
+
+def find_files(search_dir: pathlib.Path, search_string: str, newest_only: bool = False,
+        workers: int = 1, index: pathlib.Path | None = None, refresh: bool = True,
+        limit: int | None = None, max_age: float | None = None) -> list[str]:
+    """
+    Search for file containing search_string. Return a list of file names.
+    See iter_files for the parameters.
 
     Returns
     -------
     list[str]
         A list of file name strings.
     """
-    file_match = re.compile(re.escape(search_string), re.IGNORECASE)
-    file_list = []
-    # recursively get directories one at a time (required for 'newest_only' functionality)
-    for dir in pathlib.Path(search_dir).glob('**/'): 
-        latest_file = None
-        for file in dir.iterdir():
-            if file.is_file() and file_match.search(file.name):
-                if newest_only:
-                    if not latest_file:
-                        latest_file = file
-                    elif file.stat().st_mtime > latest_file.stat().st_mtime:
-                        latest_file = file
-                else:
-                    file_list.append(str(file))
-        if newest_only and latest_file:
-            file_list.append(str(latest_file))
-
-    return file_list
-
-def main() -> 1:
+    return list(iter_files(search_dir, search_string, newest_only, workers, index, refresh, limit, max_age))
+
+# Like grep, a file with a NUL byte in its first block is treated as binary
+BINARY_CHECK_BYTES = 8192
+NEWLINE_COUNT_CHUNK = 1 << 20
+
+def _count_newlines(mapped: mmap.mmap, start: int, end: int) -> int:
+    # Count in bounded chunks, so a large gap between matches is never copied at once
+    count = 0
+    for chunk_start in range(start, end, NEWLINE_COUNT_CHUNK):
+        count += mapped[chunk_start:min(chunk_start + NEWLINE_COUNT_CHUNK, end)].count(b'\n')
+    return count
+
+def search_file_contents(file: str, content_match: re.Pattern, max_size: int) -> list[tuple[str, int, int]]:
+    """
+    Search the contents of a single file through a read-only memory map.
+
+    Parameters
+    ----------
+    file : str
+        The file to search.
+    content_match : re.Pattern
+        The compiled (bytes) pattern to search for.
+    max_size : int
+        Files larger than this (in bytes) are skipped.
+
+    Returns
+    -------
+    list[tuple[str, int, int]]
+        A (file, line number, byte offset) tuple for each match. Binary, empty,
+        oversized and unreadable files return an empty list.
+    """
+    results = []
+    try:
+        with open(file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be memory mapped (and has nothing to match)
+            if size == 0 or size > max_size:
+                logging.debug('Skipping %s: size %d', file, size)
+                return results
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped.find(b'\0', 0, BINARY_CHECK_BYTES) != -1:
+                    logging.debug('Skipping binary file %s', file)
+                    return results
+                line = 1
+                line_offset = 0
+                for match in content_match.finditer(mapped):
+                    line += _count_newlines(mapped, line_offset, match.start())
+                    line_offset = match.start()
+                    results.append((file, line, match.start()))
+    except (OSError, ValueError) as err:
+        logging.debug('Skipping %s: %s', file, err)
+
+    return results
+
+def _search_file_batch(files: list[str], content_match: re.Pattern, max_size: int) -> list[tuple[str, int, int]]:
+    # Batching many (usually small) files into one task amortizes the IPC cost per file
+    results = []
+    for file in files:
+        results.extend(search_file_contents(file, content_match, max_size))
+    return results
+
+def iter_content_matches(files: Iterable[str], search_string: str, max_size: int,
+        processes: int | None = None, batch_size: int = 64) -> Iterator[tuple[str, int, int]]:
+    """
+    Search the contents of files across a process pool. Yield each match, in
+    the order of files. Closing the generator early stops the search.
+
+    Parameters
+    ----------
+    files : Iterable[str]
+        The files to search, e.g. from iter_files. Consumed lazily.
+    search_string : str
+        The string to match in the file contents (case insensitive).
+    max_size : int
+        Files larger than this (in bytes) are skipped.
+    processes : int | None
+        The number of worker processes. None uses one per CPU.
+    batch_size : int
+        The number of files sent to a worker in each task.
+
+    Yields
+    ------
+    tuple[str, int, int]
+        The file, line number (from 1) and byte offset of a match.
+    """
+    content_match = re.compile(re.escape(search_string.encode()), re.IGNORECASE)
+    files = iter(files)
+    processes = processes or os.cpu_count() or 1
+    # Keep a bounded window of batches in flight, consumed in submission order
+    max_in_flight = 4 * processes
+    with ProcessPoolExecutor(max_workers=processes) as PPE:
+        in_flight = deque()
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    batch = [file for _, file in zip(range(batch_size), files)]
+                    if not batch:
+                        break
+                    in_flight.append(PPE.submit(_search_file_batch, batch, content_match, max_size))
+                if not in_flight:
+                    break
+                yield from in_flight.popleft().result()
+        finally:
+            for job_future in in_flight:
+                job_future.cancel()
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
+    parser = script_parser('DEBUG', prog)
     parser.add_argument('-d', '--search_dir', default=pathlib.Path().cwd(), type=pathlib.Path,
         help='The directory from where to start the search for matching files')
     parser.add_argument('-s', '--search_string', required=True, type=str,
-        help='The string to search in the file names')
+        help='The string to search in the file names (or file contents, with --content)')
     parser.add_argument('-n', '--newest_only', action='store_true',
         help='For each directory, only return the file with the newest modified timestamp')
-    args = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=min(32, (os.cpu_count() or 1) + 4),
+        help='The number of threads used to scan directories. Use 1 to scan in a single thread.')
+    parser.add_argument('-i', '--index', type=pathlib.Path, default=None,
+        help='Keep a persistent file index at this location and answer the search from it. '
+            'Only directories that changed since the last run are rescanned.')
+    parser.add_argument('--no_refresh', action='store_true',
+        help='With --index, query the index as is without checking for changes')
+    parser.add_argument('--max_age', type=float, default=0,
+        help='With --index, only check for changes if the index was last checked more than this many '
+            'seconds ago (the default 0 always checks). Checking calls stat on every indexed directory, '
+            'so a limit speeds up repeated searches of a large tree, which may then miss recent changes.')
+    parser.add_argument('-c', '--content', action='store_true',
+        help='Match the search string against the file contents instead of the file names')
+    parser.add_argument('--name_filter', type=str, default='',
+        help='With --content, only search the files whose names contain this string')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+        help='With --content, the number of processes searching file contents. Defaults to one per CPU.')
+    parser.add_argument('--max_size', type=float, default=100,
+        help='With --content, skip files larger than this (in MB)')
+    limit_group = parser.add_mutually_exclusive_group()
+    limit_group.add_argument('-l', '--limit', type=int, default=None,
+        help='Stop searching after this many files (or content matches) are found')
+    limit_group.add_argument('--first', action='store_true',
+        help='Stop searching after the first file is found')
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
     # --------------------------------------------------
     # Additional argument validation (if necessary)
-    if not args.search_string.isascii() or '/' in args.search_string or '\\' in args.search_string:
+    if args.content:
+        if not args.search_string.isascii():
+            logging.critical('--search_string is restricted to the ASCII character set')
+            return 1
+    elif not args.search_string.isascii() or '/' in args.search_string or '\\' in args.search_string:
         logging.critical('--search_string is restricted to the ASCII character set, and cannot include "/" or "\\"')
         return 1
+    if args.no_refresh and not args.index:
+        logging.critical('--no_refresh requires --index')
+        return 1
+    if args.max_age < 0:
+        logging.critical('--max_age cannot be negative')
+        return 1
+    if args.limit is not None and args.limit < 1:
+        logging.critical('--limit must be at least 1')
+        return 1
+    if args.processes is not None and args.processes < 1:
+        logging.critical('--processes must be at least 1')
+        return 1
+    if args.workers < 1:
+        logging.critical('--workers must be at least 1')
+        return 1
 
     # --------------------------------------------------
     # Functionality starts here
-    file_list = find_files(args.search_dir, args.search_string, args.newest_only)
-    if not file_list:
+    limit = 1 if args.first else args.limit
+    found = False
+    if args.content:
+        files = iter_files(args.search_dir, args.name_filter, args.newest_only, args.workers,
+            args.index, not args.no_refresh, max_age=args.max_age)
+        matches = iter_content_matches(files, args.search_string, int(args.max_size * 1024 * 1024),
+            args.processes)
+        for file, line, offset in itertools.islice(matches, limit):
+            print(f'{file}:{line}:{offset}', flush=True)
+            found = True
+        matches.close()
+        files.close()
+        if not found:
+            print("No matches found")
+        return 0
+    # print each file as it is found, rather than waiting for the whole search
+    for f in iter_files(args.search_dir, args.search_string, args.newest_only, args.workers,
+            args.index, not args.no_refresh, limit, args.max_age):
+        print(f, flush=True)
+        found = True
+    if not found:
         print("No files found")
-    else:
-        for f in file_list:
-            print(f)
-            
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+File name: file_search_benchmark.py
+Description: Compares the original pathlib based search with the scandir
+    based find_files (single and multi-threaded, and using a persistent
+    index) from file_search.py on a generated directory tree. Every run is
+    checked to return the same results.
+Python Version: 3.x
+
+NOTE: Generating the default tree (1M files) takes a while and needs a few
+hundred MB of inodes. Use --keep_tree / --tree_dir to reuse a generated tree.
+"""
+
+import sys
+import logging
+import pathlib
+import re
+import shutil
+import tempfile
+import time
+from file_search import find_files
+from logging_module import setup_logging
+from startup_module import script_parser
+
+def pathlib_find_files(search_dir: pathlib.Path, search_string: str, newest_only: bool = False) -> list[str]:
+    """
+    The original pathlib based implementation of find_files, kept as a baseline.
+
+    Parameters
+    ----------
+    search_dir : pathlib.Path
+        The directory to start searching.
+    search_string : str
+        The string to match in the file name.
+    newest_only : bool
+        For each directory, only return the file with the latest modified timestamp.
+
+    Returns
+    -------
+    list[str]
+        A list of file name strings.
+    """
+    file_match = re.compile(re.escape(search_string), re.IGNORECASE)
+    file_list = []
+    for dir in pathlib.Path(search_dir).glob('**/'):
+        latest_file = None
+        for file in dir.iterdir():
+            if file.is_file() and file_match.search(file.name):
+                if newest_only:
+                    if not latest_file:
+                        latest_file = file
+                    elif file.stat().st_mtime > latest_file.stat().st_mtime:
+                        latest_file = file
+                else:
+                    file_list.append(str(file))
+        if newest_only and latest_file:
+            file_list.append(str(latest_file))
+
+    return file_list
+
+def make_tree(tree_dir: pathlib.Path, num_files: int, files_per_dir: int = 1000, fan_out: int = 10) -> None:
+    """
+    Create a directory tree of empty files, files_per_dir in each directory,
+    with each directory holding up to fan_out subdirectories.
+
+    Parameters
+    ----------
+    tree_dir : pathlib.Path
+        The root of the tree to create.
+    num_files : int
+        The total number of files to create.
+    files_per_dir : int
+        The number of files in each directory.
+    fan_out : int
+        The number of subdirectories per directory.
+    """
+    dirs = [tree_dir]
+    created = 0
+    d = 0
+    while created < num_files:
+        current = dirs[d]
+        current.mkdir(parents=True, exist_ok=True)
+        for f in range(min(files_per_dir, num_files - created)):
+            (current / f'file_{f:04d}.{"log" if f % 10 else "txt"}').touch()
+        created += files_per_dir
+        dirs.extend(current / f'dir_{s}' for s in range(fan_out))
+        d += 1
+    logging.info('Created %d files in %d directories under %s', num_files, d, tree_dir)
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-f', '--num_files', type=int, default=1_000_000,
+        help='The number of files to generate.')
+    parser.add_argument('-t', '--tree_dir', type=pathlib.Path, default=None,
+        help='Where to generate the tree. An existing tree at this location is reused.')
+    parser.add_argument('-k', '--keep_tree', action='store_true',
+        help='Do not delete the generated tree when finished.')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 8, 32],
+        help='The thread counts to benchmark.')
+    parser.add_argument('-s', '--search_string', type=str, default='.txt',
+        help='The string to search in the file names')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    tree_dir = args.tree_dir or pathlib.Path(tempfile.mkdtemp(prefix='file_search_benchmark_'))
+    try:
+        if not tree_dir.exists() or not any(tree_dir.iterdir()):
+            make_tree(tree_dir, args.num_files)
+        index_file = tree_dir.with_name(tree_dir.name + '.index')
+        start = time.perf_counter()
+        find_files(tree_dir, args.search_string, index=index_file)
+        print(f'Building the index took {time.perf_counter() - start:.2f}s')
+        for newest_only in (False, True):
+            print('=' * 50)
+            print(f'newest_only={newest_only}')
+            start = time.perf_counter()
+            expected = pathlib_find_files(tree_dir, args.search_string, newest_only)
+            baseline = time.perf_counter() - start
+            print(f'{"pathlib":>12}: {baseline:8.2f}s ({len(expected)} files)')
+            for workers in args.workers:
+                start = time.perf_counter()
+                result = find_files(tree_dir, args.search_string, newest_only, workers)
+                elapsed = time.perf_counter() - start
+                if result != expected:
+                    logging.critical('Results differ from the pathlib baseline with %d workers', workers)
+                    return 1
+                print(f'{f"scandir x{workers}":>12}: {elapsed:8.2f}s (speedup {baseline / elapsed:.1f}x)')
+            # The index answers in directory path order, so compare it unordered
+            # 'recent' skips the check for changes, as the index was refreshed less than a minute ago
+            for label, refresh, max_age in (('index', True, None), ('recent', True, 60), ('no refresh', False, None)):
+                start = time.perf_counter()
+                result = find_files(tree_dir, args.search_string, newest_only, index=index_file, refresh=refresh,
+                    max_age=max_age)
+                elapsed = time.perf_counter() - start
+                if sorted(result) != sorted(expected):
+                    logging.critical('Results differ from the pathlib baseline using the index (%s)', label)
+                    return 1
+                print(f'{label:>12}: {elapsed:8.2f}s (speedup {baseline / elapsed:.1f}x)')
+    finally:
+        if not args.keep_tree and not args.tree_dir:
+            shutil.rmtree(tree_dir)
+            for index_file in tree_dir.parent.glob(tree_dir.name + '.index*'):
+                index_file.unlink()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
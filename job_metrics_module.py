@@ -0,0 +1,151 @@
+import csv
+import json
+import logging
+import math
+import os
+import pathlib
+import pickle
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, fields
+
+@dataclass
+class JobMetrics:
+    job: str
+    pid: int
+    thread: str
+    submitted: float
+    started: float
+    finished: float
+    args_bytes: int = 0
+    result_bytes: int = 0
+
+    @property
+    def queue_wait(self) -> float:
+        return self.started - self.submitted
+
+    @property
+    def run_time(self) -> float:
+        return self.finished - self.started
+
+    @property
+    def latency(self) -> float:
+        return self.finished - self.submitted
+
+class MeasuredJob:
+    """
+    Wraps a job function so that each call is timed where it runs (in the
+    worker). Called as job(submitted, job_arg), it returns (result, JobMetrics)
+    for func(*job_arg). submitted is the wall clock time (time.time()) the job
+    was handed to the pool, since perf_counter values can't be compared across
+    processes. With measure_pickle, the pickled size of the arguments and of
+    the result is recorded too, at the cost of pickling each of them once more.
+    """
+
+    def __init__(self, func: Callable, measure_pickle: bool = False):
+        self.func = func
+        self.measure_pickle = measure_pickle
+
+    def _metrics(self, job_arg: tuple, result: object, submitted: float, started: float) -> JobMetrics:
+        finished = time.time()
+        metrics = JobMetrics(repr(job_arg), os.getpid(), threading.current_thread().name,
+            submitted, started, finished)
+        if self.measure_pickle:
+            metrics.args_bytes = len(pickle.dumps(job_arg))
+            metrics.result_bytes = len(pickle.dumps(result))
+        return metrics
+
+    def __call__(self, submitted: float, job_arg: tuple) -> tuple[object, JobMetrics]:
+        started = time.time()
+        result = self.func(*job_arg)
+        return result, self._metrics(job_arg, result, submitted, started)
+
+class MeasuredAsyncJob(MeasuredJob):
+    """The MeasuredJob counterpart for async job functions."""
+
+    async def __call__(self, submitted: float, job_arg: tuple) -> tuple[object, JobMetrics]:
+        started = time.time()
+        result = await self.func(*job_arg)
+        return result, self._metrics(job_arg, result, submitted, started)
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return math.nan
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class MetricsCollector:
+    """
+    Collects the JobMetrics of completed jobs, logs a live summary line at
+    most every summary_interval seconds, and writes a JSON or CSV report.
+    """
+
+    def __init__(self, summary_interval: float = 1.0):
+        self.jobs = []
+        self.summary_interval = summary_interval
+        self.start = time.time()
+        self._last_summary = time.perf_counter()
+        self._last_count = 0
+
+    def add(self, metrics: JobMetrics) -> None:
+        self.jobs.append(metrics)
+        now = time.perf_counter()
+        if now - self._last_summary >= self.summary_interval:
+            recent = self.jobs[self._last_count:]
+            logging.info('%d jobs done, %.1f jobs/s, mean run time %.3fs, mean queue wait %.3fs', len(self.jobs),
+                len(recent) / (now - self._last_summary), sum(m.run_time for m in recent) / len(recent),
+                sum(m.queue_wait for m in recent) / len(recent))
+            self._last_summary = now
+            self._last_count = len(self.jobs)
+
+    def summary(self) -> dict:
+        """
+        Return the aggregate metrics: throughput, latency percentiles and the
+        utilization (busy time / elapsed time) of each worker. NOTE: Jobs on
+        an asyncio event loop overlap, so their utilization can exceed 100%
+        (it is then the average number of jobs running at once).
+        """
+        elapsed = time.time() - self.start
+        summary = {'jobs': len(self.jobs), 'elapsed': elapsed,
+            'throughput': len(self.jobs) / elapsed if elapsed else math.nan}
+        for name in ('queue_wait', 'run_time', 'latency'):
+            values = sorted(getattr(m, name) for m in self.jobs)
+            for percent in (50, 95, 99):
+                summary[f'{name}_p{percent}'] = _percentile(values, percent)
+            summary[f'{name}_max'] = values[-1] if values else math.nan
+        busy = {}
+        for m in self.jobs:
+            worker = f'{m.pid}/{m.thread}'
+            busy[worker] = busy.get(worker, 0) + m.run_time
+        summary['workers'] = {worker: {'busy': busy_time, 'utilization': busy_time / elapsed if elapsed else math.nan}
+            for worker, busy_time in sorted(busy.items())}
+        return summary
+
+    def summary_text(self) -> str:
+        summary = self.summary()
+        lines = [f'{summary["jobs"]} jobs in {summary["elapsed"]:.2f}s ({summary["throughput"]:.1f} jobs/s)']
+        for name in ('queue_wait', 'run_time', 'latency'):
+            lines.append(f'{name:>10}: p50 {summary[f"{name}_p50"]:.3f}s, p95 {summary[f"{name}_p95"]:.3f}s, '
+                f'p99 {summary[f"{name}_p99"]:.3f}s, max {summary[f"{name}_max"]:.3f}s')
+        for worker, stats in summary['workers'].items():
+            lines.append(f'worker {worker}: busy {stats["busy"]:.2f}s, utilization {stats["utilization"]:.0%}')
+        return '\n'.join(lines)
+
+    def write(self, metrics_file: pathlib.Path) -> None:
+        """
+        Write a report to metrics_file. A '.csv' file gets one row per job,
+        anything else a JSON document with the summary and every job.
+        """
+        metrics_file = pathlib.Path(metrics_file)
+        columns = [f.name for f in fields(JobMetrics)] + ['queue_wait', 'run_time', 'latency']
+        rows = [dict(asdict(m), queue_wait=m.queue_wait, run_time=m.run_time, latency=m.latency) for m in self.jobs]
+        if metrics_file.suffix.lower() == '.csv':
+            with open(metrics_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(metrics_file, 'w') as f:
+                json.dump({'summary': self.summary(), 'jobs': rows}, f, indent=2)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+import math
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+
+def _as_floats(values) -> np.ndarray:
+    # pandas nullable integers can't be converted to floats unless told what missing values become
+    if hasattr(values, 'to_numpy'):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+class LinearFit:
+    """
+    Streaming least-squares line and Pearson correlation of y against x.
+    Feed it the data in any number of chunks with update; only the count,
+    the means, and the sums of squared (and cross) deviations from the
+    means are kept, so the data never has to be in memory at once. Each
+    chunk is summarized with vectorized NumPy operations and merged with
+    the running totals (Chan et al.'s pairwise update), which is as
+    accurate as computing over all the data at once. The results match
+    Series.corr(method='pearson') and np.polyfit(x, y, 1). Like
+    Series.corr, pairs where x or y is missing (NaN) are left out.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+        self.min_x = math.inf
+        self.max_x = -math.inf
+
+    def update(self, x, y) -> None:
+        """
+        Add a chunk of the data.
+
+        Parameters
+        ----------
+        x, y : array_like
+            The x and y values of the chunk (e.g. two columns of a DataFrame).
+        """
+        x, y = _as_floats(x), _as_floats(y)
+        present = ~(np.isnan(x) | np.isnan(y))
+        if not present.all():
+            x, y = x[present], y[present]
+        n = len(x)
+        if not n:
+            return
+        mean_x, mean_y = x.mean(), y.mean()
+        dx, dy = x - mean_x, y - mean_y
+        m2_x, m2_y, c_xy = dx @ dx, dy @ dy, dx @ dy
+        total = self.n + n
+        delta_x, delta_y = mean_x - self.mean_x, mean_y - self.mean_y
+        weight = self.n * n / total
+        self.m2_x += m2_x + delta_x * delta_x * weight
+        self.m2_y += m2_y + delta_y * delta_y * weight
+        self.c_xy += c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * n / total
+        self.mean_y += delta_y * n / total
+        self.n = total
+        self.min_x = min(self.min_x, x.min())
+        self.max_x = max(self.max_x, x.max())
+
+    def corr(self) -> float:
+        """The Pearson correlation coefficient (NaN with fewer than 2 points or no variance)."""
+        denominator = math.sqrt(self.m2_x * self.m2_y)
+        if self.n < 2 or not denominator:
+            return math.nan
+        # Rounding can take it just past +/-1, which is clipped as in Series.corr
+        return max(-1.0, min(1.0, self.c_xy / denominator))
+
+    def coefficients(self) -> np.ndarray:
+        """
+        The slope and intercept of the least-squares line, highest power first,
+        as returned by np.polyfit(x, y, 1).
+        """
+        slope = self.c_xy / self.m2_x if self.m2_x else math.nan
+        return np.array([slope, self.mean_y - slope * self.mean_x])
+
+    def trendline(self) -> np.poly1d:
+        """The least-squares line, as np.poly1d(np.polyfit(x, y, 1))."""
+        return np.poly1d(self.coefficients())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+File name: logging_benchmark.py
+Description: Times logging in a tight loop to a log file with the
+    logging.basicConfig setup the scripts used to have (a FileHandler
+    that writes and flushes each record on the calling thread) and with
+    setup_logging from logging_module.py (a queue, written in batches on a
+    background thread), the cost of disabled debug messages formatted as
+    f-strings and as arguments, and the logging of ProcessPoolExecutor
+    workers. Every log file is checked to have all the records.
+Python Version: 3.x
+"""
+
+import sys
+import logging
+import pathlib
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from logging_module import FILE_DATE_FORMAT, FILE_FORMAT, setup_logging, stop_logging
+from startup_module import script_parser
+
+def log_records(count: int, start: int = 0) -> int:
+    """Log count INFO records, like a hot loop logging each iteration. Returns count."""
+    for x in range(start, start + count):
+        logging.info('Processed item %d of %d', x + 1, count)
+    return count
+
+def count_lines(log_file: pathlib.Path) -> int:
+    with open(log_file, encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-n', '--num_records', type=int, default=200_000,
+        help='The number of records logged in each loop.')
+    parser.add_argument('-w', '--max_workers', type=int, default=2,
+        help='The number of worker processes logging at once.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # NOTE: This only applies to the messages of the benchmark itself, which are set up again after each loop
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    temp_dir = pathlib.Path(tempfile.mkdtemp(prefix='logging_benchmark_'))
+    try:
+        print('=' * 50)
+        print(f'Logging {args.num_records} records to a file (time in the loop, time until written)')
+        log_file = temp_dir / 'basic.log'
+        logging.basicConfig(format=FILE_FORMAT, filename=log_file, filemode='w', level='INFO',
+            datefmt=FILE_DATE_FORMAT, force=True)
+        start = time.perf_counter()
+        log_records(args.num_records)
+        baseline = time.perf_counter() - start
+        logging.shutdown()
+        print(f'{"basicConfig":>14}: {baseline:6.2f}s, {baseline:6.2f}s '
+            f'({args.num_records / baseline:,.0f} records/s)')
+        if count_lines(log_file) != args.num_records:
+            setup_logging(args.log_level, args.log_file)
+            logging.critical('%s has %d lines, expected %d', log_file, count_lines(log_file), args.num_records)
+            return 1
+
+        log_file = temp_dir / 'queue.log'
+        setup_logging('INFO', log_file)
+        start = time.perf_counter()
+        log_records(args.num_records)
+        in_loop = time.perf_counter() - start
+        # Waits for the listener to write the rest
+        stop_logging()
+        elapsed = time.perf_counter() - start
+        print(f'{"setup_logging":>14}: {in_loop:6.2f}s, {elapsed:6.2f}s '
+            f'({args.num_records / elapsed:,.0f} records/s, {baseline / in_loop:.1f}x faster in the loop)')
+        setup_logging(args.log_level, args.log_file)
+        if count_lines(log_file) != args.num_records:
+            logging.critical('%s has %d lines, expected %d', log_file, count_lines(log_file), args.num_records)
+            return 1
+
+        print('=' * 50)
+        print(f'{args.num_records} disabled debug messages (time per message)')
+        setup_logging('INFO', temp_dir / 'disabled.log')
+        start = time.perf_counter()
+        for x in range(args.num_records):
+            logging.debug(f'Processed item {x + 1} of {args.num_records}')
+        eager = (time.perf_counter() - start) / args.num_records
+        start = time.perf_counter()
+        for x in range(args.num_records):
+            logging.debug('Processed item %d of %d', x + 1, args.num_records)
+        lazy = (time.perf_counter() - start) / args.num_records
+        setup_logging(args.log_level, args.log_file)
+        print(f'{"f-string":>14}: {eager * 1e9:6.0f}ns')
+        print(f'{"arguments":>14}: {lazy * 1e9:6.0f}ns ({eager / lazy:.1f}x faster)')
+
+        print('=' * 50)
+        print(f'{args.max_workers} worker processes logging {args.num_records} records between them')
+        log_file = temp_dir / 'workers.log'
+        setup_logging('INFO', log_file)
+        chunk = args.num_records // args.max_workers
+        start = time.perf_counter()
+        with ProcessPoolExecutor(args.max_workers) as executor:
+            logged = sum(executor.map(log_records, [chunk] * args.max_workers,
+                range(0, chunk * args.max_workers, chunk)))
+        stop_logging()
+        elapsed = time.perf_counter() - start
+        setup_logging(args.log_level, args.log_file)
+        print(f'{"setup_logging":>14}: {elapsed:6.2f}s ({logged / elapsed:,.0f} records/s)')
+        if count_lines(log_file) != logged:
+            logging.critical('%s has %d lines, expected %d', log_file, count_lines(log_file), logged)
+            return 1
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.queues
+import os
+import pathlib
+import queue
+import sys
+import threading
+
+FILE_FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+FILE_DATE_FORMAT = '%Y/%m/%d %I:%M:%S'
+CONSOLE_FORMAT = '%(levelname)s:%(message)s'
+# The most records a listener writes at once
+BATCH_RECORDS = 1000
+
+class _Formatter(logging.Formatter):
+    # With a datefmt (which has no fraction of a second), the time only needs formatting
+    # once a second, rather than for every record
+
+    def __init__(self, fmt: str, datefmt: str | None = None):
+        super().__init__(fmt, datefmt)
+        # (second, its formatted time), replaced as a whole, as the listener threads share it
+        self._time = (None, None)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        if datefmt is None:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        cached = self._time
+        if cached[0] != second:
+            cached = self._time = (second, super().formatTime(record, datefmt))
+        return cached[1]
+
+class _BatchHandler(logging.StreamHandler):
+    # A StreamHandler that doesn't flush after each record: the listeners flush once per
+    # batch, and the screen (stdout) is flushed by its own buffering, as print is
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def write_batch(self, batch: list) -> None:
+        """Write a batch of records (or lines already formatted by a worker), and flush."""
+        lines = []
+        for record in batch:
+            if isinstance(record, str):
+                lines.append(record)
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        with self.lock:
+            if lines:
+                self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.stream.flush()
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    # Queues the record as it is, without the lock of Handler.handle (the queue is thread
+    # safe) and, unlike QueueHandler.prepare, without formatting it: that is left to the
+    # listener thread
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if self.filters and not self.filter(record):
+            return False
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+        return True
+
+class _WorkerQueueHandler(logging.handlers.QueueHandler):
+    # Queues the formatted line: a string is much cheaper to send to another process than
+    # a record, and the worker (rather than the listener) does the formatting
+
+    def prepare(self, record: logging.LogRecord) -> str:
+        return self.format(record)
+
+class _Listener:
+    # Writes the records from a queue to handler on a background thread, a batch at a time
+
+    def __init__(self, records, handler: _BatchHandler, name: str):
+        self.records = records
+        self.handler = handler
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Block for the first record, then take whatever else is waiting
+            batch = [self.records.get()]
+            try:
+                while len(batch) < BATCH_RECORDS and batch[-1] is not None:
+                    batch.append(self.records.get_nowait())
+            except queue.Empty:
+                pass
+            stop = batch[-1] is None
+            self.handler.write_batch(batch[:-1] if stop else batch)
+            if stop:
+                return
+
+    def stop(self) -> None:
+        """Write the records queued so far, and stop the thread."""
+        self.records.put(None)
+        self.thread.join()
+
+class _LoggingState:
+    # What setup_logging created, so stop_logging (or a forked child) can undo it
+
+    def __init__(self, level: int, log_format: str, date_format: str | None, handler: _BatchHandler,
+            root_handler: logging.Handler, listener: _Listener | None):
+        self.level = level
+        self.log_format = log_format
+        self.date_format = date_format
+        self.handler = handler
+        self.root_handler = root_handler
+        self.listener = listener
+        # The queue the worker processes log to, and its listener, created by _worker_queue
+        self.worker_queue = None
+        self.worker_listener = None
+
+_state = None
+_state_lock = threading.Lock()
+
+def _skip_record_details() -> None:
+    # The optimizations of the logging HOWTO: records don't look up the caller's frame, or
+    # the thread and process, which the formats don't show
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+def setup_logging(log_level: str | int = 'INFO', log_file: pathlib.Path | None = None) -> None:
+    """
+    Configure the root logger for the --log_level and --log_file options of
+    the scripts, replacing the logging.basicConfig block they used to
+    repeat (with the same formats, and log_file overwritten).
+
+    Records for log_file are put on a queue and written by a background
+    thread, in batches with one write and flush each, so logging doesn't
+    wait for file I/O. Records for the screen (stdout) are written when they
+    are logged, so they stay in order with print output, but aren't flushed
+    one by one. Logging from the worker processes of a ProcessPoolExecutor
+    (or multiprocessing.Pool) is sent to this process and written by
+    another background thread: automatically for forked workers, and
+    through init_worker for the other start methods. Everything is written
+    when the program exits (see stop_logging).
+    Records don't collect the caller's file, line and function, or the
+    thread and process names, which the formats don't show, as that is
+    most of the cost of a record.
+    NOTE: Pass the values to log as arguments, e.g.
+    logging.debug('Got %s', value), rather than as an f-string, so the
+    message is only formatted if its level is enabled.
+
+    Parameters
+    ----------
+    log_level : str | int
+        The minimum level logged, e.g. 'INFO'.
+    log_file : pathlib.Path | None
+        The file to log to. None logs to the screen.
+    """
+    global _state
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    _skip_record_details()
+    if log_file:
+        log_format, date_format = FILE_FORMAT, FILE_DATE_FORMAT
+        handler = _BatchHandler(open(log_file, 'w', encoding='utf-8'))
+        # SimpleQueue is much cheaper than queue.Queue, having no task tracking or size limit
+        records = queue.SimpleQueue()
+        listener = _Listener(records, handler, 'logging_module-listener')
+        root_handler = _LocalQueueHandler(records)
+    else:
+        log_format, date_format = CONSOLE_FORMAT, None
+        handler = root_handler = _BatchHandler(sys.stdout)
+        listener = None
+    handler.setFormatter(_Formatter(log_format, date_format))
+    root.addHandler(root_handler)
+    root.setLevel(log_level)
+    with _state_lock:
+        _state = _LoggingState(root.level, log_format, date_format, handler, root_handler, listener)
+
+def stop_logging() -> None:
+    """
+    Write the records logged so far (by this process and its workers),
+    stop the background threads and close the log file. Called when the
+    program exits. Logging afterwards uses the logging defaults.
+    """
+    global _state
+    with _state_lock:
+        state, _state = _state, None
+    if state is None:
+        return
+    logging.getLogger().removeHandler(state.root_handler)
+    if state.listener:
+        state.listener.stop()
+    if state.worker_listener:
+        # A worker still running would lose the rest of its records
+        state.worker_listener.stop()
+        state.worker_queue.close()
+    state.handler.flush()
+    if state.handler.stream is not sys.stdout:
+        state.handler.stream.close()
+    state.handler.close()
+
+atexit.register(stop_logging)
+
+def _worker_queue() -> multiprocessing.queues.Queue | None:
+    # The queue worker processes log to, created (with the thread that writes its records) on first use
+    with _state_lock:
+        state = _state
+        if state is None:
+            return None
+        if state.worker_queue is None:
+            # A queue of the 'spawn' context can be passed to workers of any start method (a 'fork' one can't)
+            state.worker_queue = multiprocessing.get_context('spawn').Queue()
+            state.worker_listener = _Listener(state.worker_queue, state.handler, 'logging_module-worker-listener')
+        return state.worker_queue
+
+def init_worker(log_queue: multiprocessing.queues.Queue | None, log_level: int = logging.WARNING,
+        log_format: str = CONSOLE_FORMAT, date_format: str | None = None) -> None:
+    """
+    Send the logging of this (worker) process to log_queue, to be written
+    by the process that called setup_logging. Use it (with worker_initargs)
+    as the initializer of a process pool, or call it from one, e.g.
+    ProcessPoolExecutor(initializer=init_worker, initargs=worker_initargs()).
+    Forked workers don't need it, as they are set up when they start.
+    """
+    global _state
+    root = logging.getLogger()
+    # Not closed: they belong to the parent (a forked child has copies of them)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if log_queue is not None:
+        handler = _WorkerQueueHandler(log_queue)
+        handler.setFormatter(_Formatter(log_format, date_format))
+        root.addHandler(handler)
+        root.setLevel(log_level)
+        _skip_record_details()
+    # The records are written by the parent's listener
+    _state = None
+
+def worker_initargs() -> tuple:
+    """The initargs of init_worker, for the logging set up by setup_logging."""
+    log_queue = _worker_queue()
+    state = _state
+    if state is None:
+        return (None,)
+    return log_queue, state.level, state.log_format, state.date_format
+
+def _before_fork() -> None:
+    state = _state
+    if state is not None:
+        _worker_queue()
+        # A forked child copies the unwritten buffer of the handler, which it mustn't write again
+        state.handler.acquire()
+        state.handler.flush()
+
+def _after_fork_in_parent() -> None:
+    state = _state
+    if state is not None:
+        state.handler.release()
+
+def _after_fork_in_child() -> None:
+    # The listener threads don't exist in the child, so it logs through the worker queue.
+    # (logging itself has already replaced the locks of the handlers.)
+    state = _state
+    if state is not None:
+        init_worker(state.worker_queue, state.level, state.log_format, state.date_format)
+
+os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+    after_in_child=_after_fork_in_child)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+File name: memoize_benchmark.py
+Description: Times the @memoize decorator of memoize_module.py on a
+    per-team aggregation of the batting data (repeated --copies times, to
+    make it larger): repeated calls with the same and with an equal copy of
+    the DataFrame, the entry limit and expiry, and a ProcessPoolExecutor
+    whose workers share one on-disk cache. Every cached result is checked
+    against the uncached one.
+
+NOTE: A hit costs a fingerprint of the DataFrame, which reads all of it,
+so it only pays off for functions that take a lot longer than that. The
+workers get their data once (as in pandas_example.py) and pass the file
+and thresholds, which are cheap to key on.
+Python Version: 3.x
+
+This script requires that "pandas" be installed within the Python
+environment you are running this script in.
+"""
+
+import sys
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from batting_data_module import load_batting_data
+from logging_module import setup_logging
+from memoize_module import CacheInfo, fingerprint, memoize
+from startup_module import script_parser
+
+def team_summary(PBDF: pd.DataFrame, min_games: int = 50) -> pd.DataFrame:
+    """
+    The distribution (count, mean, standard deviation and quartiles) of
+    On-base Plus Slugging, Home Runs and Strike Outs per team, over the
+    records with at least min_games games.
+
+    Parameters
+    ----------
+    PBDF : pd.DataFrame
+        The cleaned batting DataFrame.
+    min_games : int
+        Only include records with at least this many games.
+
+    Returns
+    -------
+    pd.DataFrame
+        The statistics of each column (as DataFrame.describe), indexed by team.
+    """
+    players = PBDF[PBDF['G'] >= min_games]
+    return players.groupby('Team', observed=True)[['OPS', 'HR', 'SO']].describe()
+
+def load_data(data_file: pathlib.Path, copies: int) -> pd.DataFrame:
+    return pd.concat([load_batting_data(data_file)] * copies, ignore_index=True)
+
+# The data of each worker process, and the (memoized) worker_team_summary, set by _init_worker
+_worker_data = None
+_worker_summary = None
+
+def worker_team_summary(data_file: pathlib.Path, copies: int, min_games: int) -> pd.DataFrame:
+    """team_summary of the data of a worker process, which is identified by data_file and copies."""
+    return team_summary(_worker_data, min_games)
+
+def _init_worker(data_file: pathlib.Path, copies: int, cache_file: pathlib.Path | None) -> None:
+    global _worker_data, _worker_summary
+    _worker_data = load_data(data_file, copies)
+    _worker_summary = memoize(worker_team_summary, cache_file=cache_file) if cache_file else worker_team_summary
+
+def _worker_job(data_file: pathlib.Path, copies: int, min_games: int) -> tuple[int, CacheInfo | None, pd.DataFrame]:
+    result = _worker_summary(data_file, copies, min_games)
+    info = _worker_summary.cache_info() if hasattr(_worker_summary, 'cache_info') else None
+    return os.getpid(), info, result
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-d', '--data_file', type=pathlib.Path, default='test_data/MLB Player Batting 2022.csv',
+        help='Location of the csv file.')
+    parser.add_argument('-c', '--copies', type=int, default=500,
+        help='The number of copies of the data to concatenate.')
+    parser.add_argument('-n', '--num_calls', type=int, default=20,
+        help='The number of calls timed.')
+    parser.add_argument('-w', '--max_workers', type=int, default=2,
+        help='The number of worker processes sharing the on-disk cache.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    PBDF = load_data(args.data_file, args.copies)
+    logging.info('Loaded %d records', len(PBDF))
+    thresholds = [0, 25, 50, 100]
+    expected = {min_games: team_summary(PBDF, min_games) for min_games in thresholds}
+
+    print('=' * 50)
+    print(f'{args.num_calls} calls with the same DataFrame (time per call)')
+    start = time.perf_counter()
+    for _ in range(args.num_calls):
+        team_summary(PBDF, 50)
+    baseline = (time.perf_counter() - start) / args.num_calls
+    print(f'{"uncached":>12}: {baseline * 1000:8.1f}ms')
+    start = time.perf_counter()
+    fingerprint(PBDF)
+    elapsed = time.perf_counter() - start
+    print(f'{"fingerprint":>12}: {elapsed * 1000:8.1f}ms (the cost of a hit)')
+    memoized = memoize(team_summary)
+    start = time.perf_counter()
+    for _ in range(args.num_calls):
+        result = memoized(PBDF, 50)
+    elapsed = (time.perf_counter() - start) / args.num_calls
+    if not result.equals(expected[50]):
+        logging.critical('The memoized result differs from the uncached one')
+        return 1
+    print(f'{"memoized":>12}: {elapsed * 1000:8.1f}ms (speedup {baseline / elapsed:.1f}x) {memoized.cache_info()}')
+    if not memoized(PBDF.copy(), 50) is result or memoized.cache_info().hits != args.num_calls:
+        logging.critical('An equal copy of the DataFrame missed the cache')
+        return 1
+    print('An equal copy of the DataFrame hits the cache')
+
+    print('=' * 50)
+    print('Limits')
+    limited = memoize(team_summary, max_entries=2)
+    for min_games in thresholds * 2:
+        limited(PBDF, min_games)
+    # Cycling through more arguments than there are entries evicts each result before it is used again
+    print(f'{"max_entries":>12}: {limited.cache_info()}')
+    expiring = memoize(team_summary, ttl=0.5)
+    expiring(PBDF, 50)
+    time.sleep(0.5)
+    if not expiring(PBDF, 50).equals(expected[50]):
+        logging.critical('The result of an expired entry differs from the uncached one')
+        return 1
+    print(f'{"ttl":>12}: {expiring.cache_info()}')
+
+    print('=' * 50)
+    print(f'{args.num_calls} calls over {len(thresholds)} thresholds in {args.max_workers} worker processes')
+    job_args = [thresholds[n % len(thresholds)] for n in range(args.num_calls)]
+    temp_dir = pathlib.Path(tempfile.mkdtemp(prefix='memoize_benchmark_'))
+    try:
+        for label, cache_file in (('uncached', None), ('shared', temp_dir / 'cache.db')):
+            with ProcessPoolExecutor(args.max_workers, initializer=_init_worker,
+                    initargs=(args.data_file, args.copies, cache_file)) as executor:
+                # Warm up the pool, so loading the data isn't counted
+                list(executor.map(int, range(args.max_workers)))
+                start = time.perf_counter()
+                infos = {}
+                results = executor.map(_worker_job, [args.data_file] * len(job_args), [args.copies] * len(job_args),
+                    job_args)
+                for (pid, info, result), min_games in zip(results, job_args):
+                    if not result.equals(expected[min_games]):
+                        logging.critical('A worker returned a different result for min_games=%d', min_games)
+                        return 1
+                    infos[pid] = info
+                elapsed = time.perf_counter() - start
+            # The calls that computed the result, rather than finding it in a cache
+            computed = sum(info.misses for info in infos.values()) if cache_file else len(job_args)
+            print(f'{label:>12}: {elapsed:6.2f}s, {computed} of {len(job_args)} calls computed')
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
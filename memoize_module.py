@@ -0,0 +1,302 @@
+from __future__ import annotations
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import NamedTuple
+from result_cache_module import ResultCache
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+
+class CacheInfo(NamedTuple):
+    """The stats of a memoized function (see memoize)."""
+    hits: int
+    misses: int
+    evictions: int
+    expired: int
+    entries: int
+    bytes: int
+
+def _digest(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def fingerprint(value: object) -> Hashable:
+    """
+    A hashable stand-in for value, equal for equal values. NumPy arrays and
+    pandas objects (which are unhashable, or hashed by identity) are
+    represented by a digest of their contents, dtypes and shape (or labels),
+    so an equal copy of an argument still finds the cached result. Lists,
+    tuples, dicts and sets are fingerprinted item by item, hashable values
+    are used as they are, and any other value by a digest of its pickle.
+    The items of a set are sorted, so the fingerprint (and its pickle, see
+    ResultCache.make_key) is the same in every process.
+
+    Parameters
+    ----------
+    value : object
+        A function argument.
+
+    Returns
+    -------
+    Hashable
+        Its fingerprint.
+    """
+    # Like pandas below, NumPy isn't imported just to check, if it isn't no value can be an array
+    if 'numpy' in sys.modules and isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return ('ndarray', value.dtype.str, value.shape, _digest(pickle.dumps(value.tolist())))
+        return ('ndarray', value.dtype.str, value.shape, _digest(np.ascontiguousarray(value).data))
+    # pandas is only imported by the scripts that use it, and if it isn't, no value can be a pandas object
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        hasher = hashlib.blake2b(digest_size=16)
+        try:
+            _hash_pandas(pd, hasher, value)
+        except TypeError:
+            # Unhashable values, e.g. a column of lists
+            return (type(value).__name__, _digest(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return (type(value).__name__, value.shape, hasher.hexdigest())
+    if isinstance(value, (tuple, list)):
+        return (type(value).__name__, tuple(fingerprint(item) for item in value))
+    if isinstance(value, dict):
+        return ('dict', tuple((fingerprint(key), fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        # A set iterates in the order of its hashes, which for strings differ from process to process
+        # (see PYTHONHASHSEED), so its items are sorted by their repr
+        return (type(value).__name__, tuple(sorted((fingerprint(item) for item in value), key=repr)))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ('pickle', _digest(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+def _hash_pandas(pd, hasher, value) -> None:
+    # Hashes the labels, dtypes and values of a DataFrame, Series or Index column by column
+    if isinstance(value, pd.Index):
+        _hash_index(pd, hasher, value)
+        return
+    _hash_index(pd, hasher, value.index)
+    columns = value.items() if isinstance(value, pd.DataFrame) else [(value.name, value)]
+    for name, column in columns:
+        hasher.update(f'{name!r}:{column.dtype}'.encode())
+        _hash_array(pd, hasher, column.array)
+
+def _hash_index(pd, hasher, index) -> None:
+    if isinstance(index, pd.RangeIndex):
+        hasher.update(repr(index).encode())
+    elif isinstance(index, pd.MultiIndex):
+        hasher.update(pd.util.hash_pandas_object(index).to_numpy().data)
+    else:
+        hasher.update(f'{index.name!r}:{index.dtype}'.encode())
+        _hash_array(pd, hasher, index.array)
+
+def _hash_array(pd, hasher, array) -> None:
+    # The raw bytes of numbers, much faster than hashing each value, which pandas only needs for objects
+    dtype = array.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        hasher.update(np.ascontiguousarray(array.codes).data)
+        _hash_array(pd, hasher, array.categories.array)
+        return
+    numpy_dtype = dtype if isinstance(dtype, np.dtype) else getattr(dtype, 'numpy_dtype', None)
+    if numpy_dtype is not None and numpy_dtype.kind in 'biuf':
+        # Nullable (e.g. Int16) arrays are hashed as their values and missing value mask
+        if not isinstance(dtype, np.dtype):
+            hasher.update(np.ascontiguousarray(array.isna()).data)
+        hasher.update(np.ascontiguousarray(array.to_numpy(numpy_dtype, na_value=0)).data)
+    else:
+        # One 64 bit hash per value (strings, dates, objects), computed in C
+        hasher.update(pd.util.hash_pandas_object(pd.Series(array, copy=False), index=False).to_numpy().data)
+
+def size_of(value: object) -> int:
+    """The approximate memory use of value in bytes, for the max_bytes limit of MemoCache."""
+    if 'numpy' in sys.modules and isinstance(value, np.ndarray):
+        return value.nbytes
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, (str, bytes, bytearray, int, float, type(None))):
+        return sys.getsizeof(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return sys.getsizeof(value)
+
+class MemoCache:
+    """
+    A thread-safe, in-memory cache with least recently used eviction, by
+    entry count (max_entries) and by the total size of the values
+    (max_bytes, see size_of), and expiry ttl seconds after an entry is
+    stored. None disables a limit. A value larger than max_bytes on its own
+    is not cached. The sizes are only computed (and counted in CacheInfo)
+    with max_bytes.
+    """
+
+    def __init__(self, max_entries: int | None = 128, max_bytes: int | None = None, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expiry time, size, value), least recently used first
+        self._entries = OrderedDict()
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Remove every entry and reset the stats."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expired = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.expired, len(self._entries), self._bytes)
+
+    def get(self, key: Hashable, default: object = None) -> object:
+        """
+        Return the value for key (marking it as recently used), or default if
+        it isn't cached or has expired. Counts a hit or a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, value: object) -> None:
+        """Cache value under key, evicting the least recently used entries to stay within the limits."""
+        size = size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expiry, size, value)
+            self._bytes += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def found(self, key: Hashable, value: object) -> None:
+        """
+        Cache value, found elsewhere (e.g. in a shared cache) after get missed
+        key, and count that lookup as a hit.
+        """
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+        self.put(key, value)
+
+    def _remove(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key)[1]
+
+class _SharedCache:
+    # The ResultCache in cache_file, opened once per process and thread (a SQLite connection
+    # can't be used from another thread, or after a fork)
+
+    def __init__(self, cache_file: pathlib.Path, max_bytes: int, ttl: float | None):
+        self.cache_file = pathlib.Path(cache_file)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _cache(self) -> ResultCache:
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.pid = os.getpid()
+            self._local.cache = ResultCache(self.cache_file, self.max_bytes)
+        return self._local.cache
+
+    def get(self, key: str, default: object = None) -> object:
+        entry = self._cache().get(key)
+        # Entries are stored with the (wall clock) time they were stored, which all processes agree on
+        if entry is None or (self.ttl is not None and entry[0] + self.ttl <= time.time()):
+            return default
+        return entry[1]
+
+    def put(self, key: str, value: object) -> None:
+        self._cache().put(key, (time.time(), value))
+
+def memoize(func: Callable | None = None, *, max_entries: int | None = 128, max_bytes: int | None = None,
+        ttl: float | None = None, cache_file: pathlib.Path | None = None, cache_max_bytes: int = 1024 ** 3):
+    """
+    Cache the results of func (which must be pure) by its arguments, like
+    functools.lru_cache, with the limits and expiry of MemoCache. Arguments
+    are matched by fingerprint, so NumPy arrays and pandas objects can be
+    passed, and match by content. With cache_file, results are also stored
+    in a ResultCache (SQLite) file, which every process using the same file
+    shares, e.g. the workers of a ProcessPoolExecutor, and which outlives
+    the program. The results (and arguments) must then be picklable.
+    Use it as @memoize or @memoize(max_entries=..., ...).
+
+    Parameters
+    ----------
+    func : Callable | None
+        The function to memoize.
+    max_entries : int | None
+        The maximum number of results kept in memory.
+    max_bytes : int | None
+        The maximum total size of the results kept in memory (see size_of).
+    ttl : float | None
+        Results expire this many seconds after they are stored.
+    cache_file : pathlib.Path | None
+        The shared, on-disk cache. None only caches in memory.
+    cache_max_bytes : int
+        The size limit of the on-disk cache.
+
+    Returns
+    -------
+    Callable
+        The memoized function, with cache_info() (the CacheInfo of the in
+        memory cache, where hits include the results found in cache_file,
+        and misses count the calls of func) and cache_clear() methods.
+    """
+    if func is None:
+        return functools.partial(memoize, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl,
+            cache_file=cache_file, cache_max_bytes=cache_max_bytes)
+    cache = MemoCache(max_entries, max_bytes, ttl)
+    shared = _SharedCache(cache_file, cache_max_bytes, ttl) if cache_file else None
+    missing = object()
+
+    @functools.wraps(func)
+    def memoized_func(*args, **kwargs):
+        key = (fingerprint(args), fingerprint(kwargs) if kwargs else None)
+        result = cache.get(key, missing)
+        if result is not missing:
+            return result
+        if shared:
+            shared_key = ResultCache.make_key(func, key)
+            result = shared.get(shared_key, missing)
+            if result is not missing:
+                cache.found(key, result)
+                return result
+        result = func(*args, **kwargs)
+        cache.put(key, result)
+        if shared:
+            shared.put(shared_key, result)
+        return result
+
+    memoized_func.cache_info = cache.info
+    memoized_func.cache_clear = cache.clear
+    return memoized_func
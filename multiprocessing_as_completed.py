@@ -3,23 +3,49 @@
 File name: multiprocessing_example.py
 Description: A simple starter template for the 'use as completed' 
     multiprocessing pattern. NOTE: This implementation uses
-    ProcessPoolExecutor and as_completed from concurrent.futures.
+    ProcessPoolExecutor and wait from concurrent.futures.
     I found this to be a simple, intuitive and robust choice
     however there are certainly other options.
+    Only a bounded number of tasks (--max_in_flight) are pending at
+    any time, and each task can run several jobs (--chunk_size), so
+    very large numbers of jobs don't exhaust memory or drown in IPC.
+    For I/O bound jobs, --backend thread or asyncio avoids starting
+    a process per CPU; asyncio runs thousands of concurrent jobs on
+    a single event loop. With --cache, job results are stored on disk
+    and a rerun only submits the jobs that have no cached result.
+    --metrics/--metrics_out report where the time goes (queue wait,
+    run time, pickled size and utilization of each worker), and
+    --profile the call counts and latencies of a_job in all the workers.
+    --result_mb makes each job also return a large NumPy array, which
+    --shared_results passes back through shared memory (see
+    shared_result_module) instead of pickling it.
 Author: Chris Zaleski
 Python Version: 3.x
 Date: 2022-11-05
 """
 
+from __future__ import annotations
 import sys
-import argparse
 import logging
 import pathlib
-from concurrent.futures import ProcessPoolExecutor
-from concurrent.futures import as_completed
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, wait
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from itertools import islice
 from time import sleep
+import asyncio
+import os
 import random
+import time
+from job_metrics_module import MeasuredAsyncJob, MeasuredJob, MetricsCollector
+from logging_module import setup_logging
+from profiling_module import enable, timed
+from result_cache_module import ResultCache
+from startup_module import lazy_import, script_parser
 
+np = lazy_import('numpy')
+
+@timed
 def a_job(job_id: int = 1, max_time: int = 2) -> str:
     """
     Waits for a random interval to simulate work. Returns a string.
@@ -40,37 +66,338 @@ def a_job(job_id: int = 1, max_time: int = 2) -> str:
     sleep(interval)
     return f'Job #{str(job_id)}, interval: {str(interval)}'
 
-def main() -> 1:
+def a_large_job(job_id: int = 1, max_time: int = 2, size_mb: float = 1,
+        shared: bool = False) -> tuple[str, np.ndarray | SharedResult]:
+    """
+    Runs a_job, then creates a large result: an array of size_mb MB (filled
+    with job_id). With shared, a handle to a shared memory copy of the
+    array is returned instead, so only the handle is pickled back to the
+    parent, which must open it with SharedArray (see shared_result_module).
+
+    Parameters
+    ----------
+    job_id : int
+        A unique job number.
+    max_time : int
+        The maximum time for the job to wait (in seconds).
+    size_mb : float
+        The size of the array (in MB).
+    shared : bool
+        Return a SharedResult handle instead of the array.
+
+    Returns
+    -------
+    tuple[str, np.ndarray | SharedResult]
+        The string of a_job, and the array or its handle.
+    """
+    result = a_job(job_id, max_time)
+    array = np.full(int(size_mb * 1024 * 1024) // 8, job_id, dtype=np.float64)
+    if not shared:
+        return result, array
+    # Only imported here: it imports the multiprocessing shared memory support
+    from shared_result_module import share_array
+    return result, share_array(array)
+
+async def a_job_async(job_id: int = 1, max_time: int = 2) -> str:
+    """
+    The asyncio version of a_job. Waits for a random interval without
+    blocking the event loop. Returns a string.
+
+    Parameters
+    ----------
+    job_id : int
+        A unique job number.
+    max_time : int
+        The maximum time for the job to wait (in seconds).
+
+    Returns
+    -------
+    str
+        A string indicating it's result.
+    """
+    interval = random.randint(1, max_time)
+    await asyncio.sleep(interval)
+    return f'Job #{str(job_id)}, interval: {str(interval)}'
+
+def run_chunk(func: Callable, chunk: list[tuple]) -> list:
+    """
+    Runs func once for each tuple of arguments in chunk. Returns the results.
+
+    Parameters
+    ----------
+    func : Callable
+        The job function.
+    chunk : list[tuple]
+        The positional arguments for each call.
+
+    Returns
+    -------
+    list
+        The result of each call, in order.
+    """
+    return [func(*job_args) for job_args in chunk]
+
+def run_as_completed(executor: Executor, func: Callable, job_args: Iterable[tuple],
+        max_in_flight: int, chunk_size: int = 1) -> Iterator:
+    """
+    Runs func(*args) on executor for each args in job_args and yields the
+    (args, result) pairs in completion order. Jobs are submitted in chunks of chunk_size
+    calls, and a new chunk is only submitted when one of the (at most)
+    max_in_flight pending chunks completes, so job_args is consumed lazily.
+
+    Parameters
+    ----------
+    executor : Executor
+        The pool to run the jobs on.
+    func : Callable
+        The job function. Must be picklable for a ProcessPoolExecutor.
+    job_args : Iterable[tuple]
+        The positional arguments for each job.
+    max_in_flight : int
+        The maximum number of chunks submitted but not yet completed.
+    chunk_size : int
+        The number of jobs run by each task.
+
+    Yields
+    ------
+    tuple[tuple, object]
+        The arguments and result of each job.
+    """
+    job_args = iter(job_args)
+    # Each pending future maps to the chunk of arguments it was submitted with
+    pending = {}
+    try:
+        while True:
+            # Top up the window of pending chunks
+            while len(pending) < max_in_flight:
+                chunk = list(islice(job_args, chunk_size))
+                if not chunk:
+                    break
+                pending[executor.submit(run_chunk, func, chunk)] = chunk
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for job_future in done:
+                yield from zip(pending.pop(job_future), job_future.result())
+    finally:
+        for job_future in pending:
+            job_future.cancel()
+
+async def run_as_completed_async(func: Callable[..., Awaitable], job_args: Iterable[tuple],
+        max_in_flight: int, concurrency: int) -> AsyncIterator:
+    """
+    The asyncio counterpart of run_as_completed. Runs func(*args) as tasks on
+    the running event loop and yields the (args, result) pairs in completion order. At
+    most max_in_flight tasks exist at any time, and a semaphore lets at most
+    concurrency of them run their job at once.
+
+    Parameters
+    ----------
+    func : Callable[..., Awaitable]
+        The (async) job function.
+    job_args : Iterable[tuple]
+        The positional arguments for each job.
+    max_in_flight : int
+        The maximum number of tasks created but not yet completed.
+    concurrency : int
+        The maximum number of jobs running at once.
+
+    Yields
+    ------
+    tuple[tuple, object]
+        The arguments and result of each job.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited_job(job_arg: tuple):
+        async with semaphore:
+            return job_arg, await func(*job_arg)
+
+    job_args = iter(job_args)
+    pending = set()
+    try:
+        while True:
+            # Top up the window of pending tasks
+            for job_arg in islice(job_args, max_in_flight - len(pending)):
+                pending.add(asyncio.create_task(limited_job(job_arg)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def skip_cached(cache: ResultCache, func: Callable, job_args: Iterable[tuple],
+        found: Callable[[tuple, object], None]) -> Iterator[tuple]:
+    """
+    Yields only the job arguments that have no cached result. found is called
+    with the arguments and result of each cached job instead, as it is found,
+    so the cached results are never held in memory.
+
+    Parameters
+    ----------
+    cache : ResultCache
+        The result cache.
+    func : Callable
+        The job function (part of the cache key).
+    job_args : Iterable[tuple]
+        The positional arguments for each job.
+    found : Callable[[tuple, object], None]
+        Called with the arguments and result of each cached job.
+
+    Yields
+    ------
+    tuple
+        The arguments of a job that still has to run.
+    """
+    missing = object()
+    for job_arg in job_args:
+        result = cache.get(cache.make_key(func, *job_arg), missing)
+        if result is missing:
+            yield job_arg
+        else:
+            found(job_arg, result)
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
+    parser = script_parser('DEBUG', prog)
     parser.add_argument('-n', '--num_jobs', type=int, default=10,
         help='The number of jobs to run.')
     parser.add_argument('-m', '--max_time', type=int, default=2,
         help='The maximum time for each job to sleep.')
-    args = parser.parse_args()
+    parser.add_argument('-b', '--backend', default='process', choices=('process', 'thread', 'asyncio'),
+        help='Run the jobs in a process pool, a thread pool, or as tasks on an asyncio event loop. '
+            'I/O bound jobs (like a_job) need neither a process nor a thread per concurrent job.')
+    parser.add_argument('-w', '--max_workers', type=int, default=None,
+        help='The number of worker processes or threads. Defaults to one process per CPU, '
+            'or the ThreadPoolExecutor default.')
+    parser.add_argument('-f', '--max_in_flight', type=int, default=None,
+        help='The maximum number of tasks submitted but not yet completed. '
+            'Defaults to twice the number of workers (or --concurrency for asyncio).')
+    parser.add_argument('-c', '--chunk_size', type=int, default=1,
+        help='The number of jobs run by each task (process and thread backends).')
+    parser.add_argument('--concurrency', type=int, default=1000,
+        help='The maximum number of jobs running at once with the asyncio backend.')
+    parser.add_argument('--cache', type=pathlib.Path, default=None,
+        help='Cache job results in this file. Jobs with a cached result are not run again, '
+            'so an interrupted run can be resumed.')
+    parser.add_argument('--cache_max_mb', type=float, default=1024,
+        help='The maximum size of the result cache (in MB). The least recently used results are evicted.')
+    parser.add_argument('--metrics', action='store_true',
+        help='Record the queue wait, run time, pickled size and worker of each job. '
+            'Logs a live summary (at INFO level) and prints the aggregate metrics at the end.')
+    parser.add_argument('--metrics_out', type=pathlib.Path, default=None,
+        help='Write the job metrics to this file (implies --metrics). '
+            'A ".csv" file gets one row per job, otherwise a JSON report is written.')
+    parser.add_argument('--result_mb', type=float, default=None,
+        help='Each job also returns a NumPy array of this size (in MB), pickled back to the parent '
+            '(process and thread backends).')
+    parser.add_argument('--shared_results', action='store_true',
+        help='With --result_mb and the process backend, return the arrays through shared memory '
+            'instead of pickling them (see shared_result_module).')
+    parser.add_argument('--profile', type=pathlib.Path, default=None,
+        help='Write the call counts and timings of a_job, merged over all the workers, to this JSON file on exit.')
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+    # --------------------------------------------------
+    # Additional argument validation (if necessary)
+    for option in ('max_workers', 'max_in_flight', 'chunk_size', 'concurrency'):
+        if getattr(args, option) is not None and getattr(args, option) < 1:
+            logging.critical('--%s must be at least 1', option)
+            return 1
+    if args.result_mb is not None and (args.result_mb < 0 or args.backend == 'asyncio'):
+        logging.critical('--result_mb must be at least 0, with the process or thread backend')
+        return 1
+    if args.shared_results and (args.result_mb is None or args.backend != 'process' or args.cache):
+        # A handle can only be opened once, so it can't be cached either
+        logging.critical('--shared_results needs --result_mb and the process backend, without --cache')
+        return 1
+    if args.profile:
+        # Before the pool starts, so the workers inherit it
+        enable(args.profile)
 
     # --------------------------------------------------
     # Functionality starts here
-    with ProcessPoolExecutor() as PPE:
-        job_future_list = [PPE.submit(a_job, n, args.max_time) for n in range(args.num_jobs)]
-        for job_future in as_completed(job_future_list):
-            print(job_future.result())
-            
+    # A generator, so the arguments for each job are only created when it is submitted
+    job_args = ((n, args.max_time) for n in range(args.num_jobs))
+    job_func = a_job_async if args.backend == 'asyncio' else a_job
+    if args.result_mb is not None:
+        job_args = ((*job_arg, args.result_mb, args.shared_results) for job_arg in job_args)
+        job_func = a_large_job
+    if args.shared_results:
+        # Only needed here: it imports the multiprocessing shared memory support
+        from shared_result_module import SharedArray, ensure_tracker
+
+    def print_result(result: str | tuple) -> None:
+        if args.result_mb is None:
+            print(result)
+            return
+        result, array = result
+        if args.shared_results:
+            # A view of the block (no copy), which is freed once the result is printed
+            with SharedArray(array) as shared_array:
+                print(f'{result}, array: {shared_array.array.nbytes / 1024 ** 2:g}MB of {shared_array.array[:1]}')
+        else:
+            print(f'{result}, array: {array.nbytes / 1024 ** 2:g}MB of {array[:1]}')
+
+    cache = ResultCache(args.cache, int(args.cache_max_mb * 1024 * 1024)) if args.cache else None
+    if cache:
+        # Cached results are printed as they are found (when the jobs after them are submitted),
+        # between the completed jobs
+        job_args = skip_cached(cache, job_func, job_args, lambda job_arg, result: print_result(result))
+
+    run_func = job_func
+    collector = MetricsCollector() if args.metrics or args.metrics_out else None
+    if collector:
+        # Tag each job with the time it is pulled from the generator, i.e. when it is submitted
+        job_args = ((time.time(), job_arg) for job_arg in job_args)
+        measured_type = MeasuredAsyncJob if args.backend == 'asyncio' else MeasuredJob
+        run_func = measured_type(job_func, measure_pickle=args.backend == 'process')
+
+    def report(job_arg: tuple, result: str) -> None:
+        if collector:
+            (_, job_arg), (result, metrics) = job_arg, result
+            collector.add(metrics)
+        if cache:
+            cache.put(cache.make_key(job_func, *job_arg), result)
+        print_result(result)
+
+    try:
+        if args.backend == 'asyncio':
+            async def print_as_completed():
+                async for job_arg, result in run_as_completed_async(run_func, job_args,
+                        args.max_in_flight or args.concurrency, args.concurrency):
+                    report(job_arg, result)
+            asyncio.run(print_as_completed())
+        else:
+            if args.backend == 'thread':
+                # The same default as ThreadPoolExecutor
+                max_workers = args.max_workers or min(32, (os.cpu_count() or 1) + 4)
+                pool_type = ThreadPoolExecutor
+            else:
+                max_workers = args.max_workers or os.cpu_count() or 1
+                pool_type = ProcessPoolExecutor
+            max_in_flight = args.max_in_flight or 2 * max_workers
+            if args.shared_results:
+                # Before the pool starts, so the workers share this process's resource tracker
+                ensure_tracker()
+            with pool_type(max_workers=max_workers) as pool:
+                for job_arg, result in run_as_completed(pool, run_func, job_args, max_in_flight, args.chunk_size):
+                    report(job_arg, result)
+    finally:
+        if cache:
+            cache.close()
+    if collector:
+        print(collector.summary_text())
+        if args.metrics_out:
+            collector.write(args.metrics_out)
+
     return 0
 
 if __name__ == '__main__':
@@ -2,7 +2,9 @@
 """
 File name: pandas_example.py
 Description: Reads a csv file of 2022 baseball batting
-    statistics and produces some simple analyses
+    statistics and produces some simple analyses. With --output_dir,
+    the charts are rendered for every team and season (csv file) to
+    image files instead, in a pool of worker processes.
 Author: Chris Zaleski
 Python Version: 3.x
 Date: 2022-11-08
@@ -14,71 +16,279 @@ Note: "numpy" should get installed by default as a dependency.
 File: "MLB Player Batting 2022.csv" is credited to www.baseball-reference.com
 """
 
+from __future__ import annotations
 import sys
-import argparse
+import glob
+import itertools
 import logging
 import pathlib
-import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from batting_data_module import load_batting_data
+from batting_schema_module import memory_report
+from linear_fit_module import LinearFit
+from logging_module import setup_logging
+from startup_module import lazy_import, script_parser
 
-def main() -> 1:
+matplotlib = lazy_import('matplotlib')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+
+# Above this many rows, the HR vs SO scatterplot is drawn as a density chart
+DENSITY_THRESHOLD = 100_000
+# The rows per chunk of the streaming trendline fit
+FIT_CHUNK_ROWS = 1_000_000
+
+def pie_chart(PBDF: pd.DataFrame, team: str, team_name: str | None = None, min_games: int = 50) -> plt.Figure:
+    """
+    A pie chart for runs per player, with at least min_games games, on one team.
+
+    Parameters
+    ----------
+    PBDF : pd.DataFrame
+        The cleaned batting DataFrame.
+    team : str
+        The team, as in the 'Team' column.
+    team_name : str | None
+        The name of the team for the title. None uses team.
+    min_games : int
+        Only include players with at least this many games.
+
+    Returns
+    -------
+    plt.Figure
+        The chart.
+    """
+    fig, ax = plt.subplots()
+    players = PBDF[(PBDF['Team'] == team) & (PBDF['G'] >= min_games)][['Player', 'R']]
+    run_vals = players['R']
+    # The lambda function calculates the original values to be shown in the pie slices
+    run_vals.plot.pie(ax=ax, labels=players['Player'],
+        title=f'{team_name or team}: Runs per player with\nat least {min_games} games',
+        ylabel='', legend=False, autopct=lambda x: '{:.0f}'.format(x*run_vals.sum()/100))
+    return fig
+
+def scatter_chart(PBDF: pd.DataFrame, density_threshold: int = DENSITY_THRESHOLD) -> plt.Figure:
+    """
+    A scatterplot with trend line for home runs vs strike outs, with the
+    correlation value in the title. Above density_threshold rows, the points
+    are binned into a hexagonal 2D histogram (colored by the number of
+    points in each bin) instead, which takes about the same time to draw
+    however many rows there are.
+
+    Parameters
+    ----------
+    PBDF : pd.DataFrame
+        The cleaned batting DataFrame.
+    density_threshold : int
+        The number of rows above which the density chart is drawn.
+
+    Returns
+    -------
+    plt.Figure
+        The chart.
+    """
+    fig, ax = plt.subplots()
+    # The correlation and trendline are computed in one pass, a chunk of rows at a time
+    fit = LinearFit()
+    for start in range(0, len(PBDF), FIT_CHUNK_ROWS):
+        chunk = PBDF.iloc[start:start + FIT_CHUNK_ROWS]
+        fit.update(chunk['HR'], chunk['SO'])
+    corr_value = fit.corr()
+    title_str = f'Home Runs vs Strike Outs\nPearson Correlation: {str(round(corr_value, 2))}'
+    if len(PBDF) > density_threshold:
+        ax.set(title = title_str, xlabel = 'Home Runs', ylabel = 'Strike Outs')
+        # hexbin can't take missing values (e.g. a season before strike outs were recorded),
+        # so like the fit, only the rows with both values are binned (and an empty chart has no bins)
+        x = PBDF['HR'].to_numpy(float, na_value=np.nan)
+        y = PBDF['SO'].to_numpy(float, na_value=np.nan)
+        present = np.isfinite(x) & np.isfinite(y)
+        if present.any():
+            bins = ax.hexbin(x[present], y[present], gridsize = 50, bins = 'log', mincnt = 1)
+            fig.colorbar(bins, ax = ax, label = 'Players')
+    else:
+        PBDF.plot.scatter(ax=ax, x ='HR', y ='SO', title = title_str, xlabel = 'Home Runs', ylabel = 'Strike Outs')
+    # The trendline is straight, so it only needs its end points. There is none without
+    # two rows that have both values (e.g. a season before strike outs were recorded).
+    if fit.n >= 2:
+        p = fit.trendline()
+        ends = np.array([fit.min_x, fit.max_x])
+        ax.plot(ends, p(ends), "r--")
+    return fig
+
+def boxplot_chart(PBDF: pd.DataFrame) -> plt.Figure:
+    """
+    A boxplot for the distribution of home runs per team.
+
+    Parameters
+    ----------
+    PBDF : pd.DataFrame
+        The cleaned batting DataFrame.
+
+    Returns
+    -------
+    plt.Figure
+        The chart.
+    """
+    fig, ax = plt.subplots()
+    PBDF[['Team','HR']].boxplot(by = 'Team', ax = ax, xlabel = 'Home Runs', ylabel = 'Teams', vert = False)
+    fig.suptitle('')
+    ax.set_title('Distribution of Home Runs by Team')
+    return fig
+
+# The data of each --output_dir worker process, by season, loaded once by _init_render_worker
+_worker_seasons = None
+
+def _init_render_worker(data_files: list[pathlib.Path], cache_dir: pathlib.Path | None) -> None:
+    global _worker_seasons
+    # Workers never show a window
+    matplotlib.use('Agg')
+    plt.style.use('ggplot')
+    # The parent has already cached the cleaned data, so this only reads the binary cache
+    _worker_seasons = {pathlib.Path(data_file).stem: load_batting_data(data_file, cache_dir)
+        for data_file in data_files}
+
+def render_chart(season: str, chart: str, team: str | None, output_file: pathlib.Path,
+        density_threshold: int = DENSITY_THRESHOLD) -> float:
+    """
+    Render one chart of one season to output_file, in a worker process.
+
+    Parameters
+    ----------
+    season : str
+        The season (the name of its csv file).
+    chart : str
+        'pie', 'scatter' or 'boxplot'.
+    team : str | None
+        The team, for a pie chart.
+    output_file : pathlib.Path
+        The image file to write. Its suffix (e.g. '.png' or '.svg') sets the format.
+    density_threshold : int
+        See scatter_chart.
+
+    Returns
+    -------
+    float
+        The time taken to render and write the chart, in seconds.
+    """
+    start = time.perf_counter()
+    PBDF = _worker_seasons[season]
+    if chart == 'pie':
+        fig = pie_chart(PBDF, team)
+    elif chart == 'scatter':
+        fig = scatter_chart(PBDF, density_threshold)
+    else:
+        fig = boxplot_chart(PBDF)
+    try:
+        fig.savefig(output_file)
+    finally:
+        # pyplot keeps every figure until it is closed, so memory would grow with each chart
+        plt.close(fig)
+    return time.perf_counter() - start
+
+def render_charts(data_files: list[pathlib.Path], cache_dir: pathlib.Path | None, output_dir: pathlib.Path,
+        image_format: str = 'png', processes: int | None = None, density_threshold: int = DENSITY_THRESHOLD) -> None:
+    """
+    Render the charts for every season (csv file), with a pie chart for each
+    team, to output_dir/<season>/, one chart per task in a process pool,
+    and print the render time of each.
+
+    Parameters
+    ----------
+    data_files : list[pathlib.Path]
+        The csv files, one per season.
+    cache_dir : pathlib.Path | None
+        The cache for the cleaned data (see load_batting_data).
+    output_dir : pathlib.Path
+        Where to write the charts.
+    image_format : str
+        The image format, e.g. 'png' or 'svg'.
+    processes : int | None
+        The number of worker processes. None uses the number of CPUs.
+    density_threshold : int
+        See scatter_chart.
+    """
+    tasks = []
+    for data_file in data_files:
+        # Loading the data here also fills the cache before the workers read it
+        PBDF = load_batting_data(data_file, cache_dir)
+        season = pathlib.Path(data_file).stem
+        season_dir = pathlib.Path(output_dir) / season
+        season_dir.mkdir(parents=True, exist_ok=True)
+        teams = sorted(PBDF.loc[PBDF['G'] >= 50, 'Team'].dropna().unique())
+        tasks += [(season, 'pie', team, season_dir / f'pie-{team}.{image_format}') for team in teams]
+        tasks += [(season, chart, None, season_dir / f'{chart}.{image_format}') for chart in ('scatter', 'boxplot')]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes, initializer=_init_render_worker,
+            initargs=(data_files, cache_dir)) as executor:
+        render_times = executor.map(render_chart, *zip(*tasks), itertools.repeat(density_threshold))
+        for (*_, output_file), render_time in zip(tasks, render_times):
+            print(f'{output_file}: {render_time:.3f}s', flush=True)
+    elapsed = time.perf_counter() - start
+    print(f'{len(tasks)} charts in {elapsed:.2f}s ({len(tasks) / elapsed:.1f} charts/s)')
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='WARNING', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
+    parser = script_parser('WARNING', prog)
     parser.add_argument('-d', '--data_file', type=pathlib.Path, default='test_data/MLB Player Batting 2022.csv',
         help='Location of the "MLB Player Batting 2022.csv" file.')
-    args = parser.parse_args()
+    parser.add_argument('-g', '--data_glob', type=str, default=None,
+        help='With --output_dir, render the charts for all the csv files (seasons) matching this pattern '
+            '(e.g. "data/*.csv") instead of --data_file.')
+    parser.add_argument('-o', '--output_dir', type=pathlib.Path, default=None,
+        help='Render the charts for every team and season to image files in this directory, '
+            'instead of showing them.')
+    parser.add_argument('-f', '--format', dest='image_format', choices=('png', 'svg'), default='png',
+        help='The image format of --output_dir.')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+        help='The number of worker processes rendering --output_dir. The default is the number of CPUs.')
+    parser.add_argument('--density_threshold', type=int, default=DENSITY_THRESHOLD,
+        help='Draw the Home Runs vs Strike Outs chart as a density (hexbin) chart above this many rows.')
+    parser.add_argument('--cache_dir', type=pathlib.Path, default='.cache',
+        help='Where to cache the cleaned data (in a binary format), so later runs skip parsing the csv file.')
+    parser.add_argument('--no_cache', action='store_true',
+        help='Always read the csv file, without using or updating the cache.')
+    parser.add_argument('--memory_report', action='store_true',
+        help='Print the memory used by each column with the default dtypes and with the compact schema.')
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
 
     # --------------------------------------------------
     # Functionality starts here
-    PBDF = pd.read_csv(args.data_file)
-    # Update some column names for readability
-    PBDF = PBDF.rename(columns={'Name': 'Player', 'Tm': 'Team'})
-    # Remove records where Team is 'TOT' (this is an aggregate and creates redundancy)
-    PBDF = PBDF[PBDF['Team'] != 'TOT']
-    # change default 'object' dtypes to pandas preferred string type
-    PBDF[['Player', 'Team', 'Lg', 'Pos Summary', 'Name-additional']] = \
-        PBDF[['Player', 'Team', 'Lg', 'Pos Summary', 'Name-additional']].astype(pd.StringDtype())
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.data_glob:
+        data_files = sorted(glob.glob(args.data_glob))
+        if not data_files:
+            logging.critical('No files match --data_glob %s', args.data_glob)
+            return 1
+    else:
+        data_files = [args.data_file]
+    if args.memory_report:
+        for data_file in data_files:
+            print(memory_report(data_file).to_string())
+    if args.output_dir:
+        # Batch mode: no display, so use the non-interactive backend
+        matplotlib.use('Agg')
+        render_charts(data_files, cache_dir, args.output_dir, args.image_format, args.processes,
+            args.density_threshold)
+        return 0
+    # Read and clean the csv file, or load the result of that from the cache
+    PBDF = load_batting_data(args.data_file, cache_dir)
 
     # Apply a default style to charts
-    matplotlib.style.use('ggplot')
+    plt.style.use('ggplot')
     # Create a pie chart for runs per player, with at least 50 games, on the Astros only
-    HOU = PBDF[(PBDF['Team'] == 'HOU') & (PBDF['G'] >= 50)][['Player', 'R']]
-    run_vals = HOU['R']
-    # The lambda function calculates the original values to be shown in the pie slices
-    run_vals.plot.pie(labels=HOU['Player'], title = 'Astros: Runs per player with\nat least 50 games', 
-        ylabel = '', legend = False, autopct=lambda x: '{:.0f}'.format(x*run_vals.sum()/100))
-
+    pie_chart(PBDF, 'HOU', 'Astros')
     # Create a scatterplot with trend line for home runs vs strike outs, and show
     # the correlation value in the title
-    corr_value = PBDF['HR'].corr(PBDF['SO'], method = 'pearson')
-    title_str = f'Home Runs vs Strike Outs\nPearson Correlation: {str(round(corr_value, 2))}'
-    PBDF.plot.scatter(x ='HR', y ='SO', title = title_str, xlabel = 'Home Runs', ylabel = 'Strike Outs')
-    # 'z' and 'p' below are for calculating the trendline
-    z = np.polyfit(PBDF['HR'], PBDF['SO'], 1)
-    p = np.poly1d(z)
-    plt.plot(PBDF['HR'], p(PBDF['HR']), "r--")
-
+    scatter_chart(PBDF, args.density_threshold)
     # Create a boxplot for the distribution of home runs per team
-    PBDF[['Team','HR']].boxplot(by = 'Team', xlabel = 'Home Runs', ylabel = 'Teams', vert = False)
-    plt.suptitle('')
-    plt.title('Distribution of Home Runs by Team')
+    boxplot_chart(PBDF)
 
     plt.show()
 
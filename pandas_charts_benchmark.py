@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+File name: pandas_charts_benchmark.py
+Description: Times the Home Runs vs Strike Outs chart of pandas_charts.py
+    (scatter_chart) drawn as a scatterplot and as a density (hexbin) chart,
+    on the batting data repeated --copies times, with --missing of the
+    Strike Outs blanked (as in the seasons before they were recorded).
+    Checks that the density chart bins exactly the rows with both values,
+    that the correlation matches Series.corr, and that a season without
+    any Strike Outs is drawn in both modes (with no bins or trendline).
+Python Version: 3.x
+
+This script requires that "pandas" and "matplotlib" be installed
+within the Python environment you are running this script in.
+"""
+
+import sys
+import io
+import logging
+import pathlib
+import time
+import matplotlib
+import numpy as np
+import pandas as pd
+from batting_data_module import load_batting_data
+from logging_module import setup_logging
+from startup_module import script_parser
+
+# No window is shown, so use the non-interactive backend (before pyplot is imported)
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from pandas_charts import scatter_chart
+
+def time_chart(PBDF: pd.DataFrame, density_threshold: int) -> tuple[plt.Figure, float]:
+    """Draw scatter_chart and render it to a png in memory. Return the figure (still open) and the time taken."""
+    start = time.perf_counter()
+    fig = scatter_chart(PBDF, density_threshold)
+    fig.savefig(io.BytesIO(), format='png')
+    return fig, time.perf_counter() - start
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-d', '--data_file', type=pathlib.Path, default='test_data/MLB Player Batting 2022.csv',
+        help='Location of the "MLB Player Batting 2022.csv" file.')
+    parser.add_argument('-c', '--copies', type=int, default=100,
+        help='The number of copies of the batting data to chart.')
+    parser.add_argument('-m', '--missing', type=float, default=0.1,
+        help='The fraction of the rows whose Strike Outs are blanked.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+    # --------------------------------------------------
+    # Additional argument validation (if necessary)
+    if args.copies < 1:
+        logging.critical('--copies must be at least 1')
+        return 1
+    if not 0 <= args.missing <= 1:
+        logging.critical('--missing must be from 0 to 1')
+        return 1
+
+    # --------------------------------------------------
+    # Functionality starts here
+    PBDF = pd.concat([load_batting_data(args.data_file, None)] * args.copies, ignore_index=True)
+    rng = np.random.default_rng(0)
+    PBDF.loc[rng.random(len(PBDF)) < args.missing, 'SO'] = pd.NA
+    present = int((PBDF['HR'].notna() & PBDF['SO'].notna()).sum())
+    logging.info('Charting %d records, %d with both Home Runs and Strike Outs', len(PBDF), present)
+    expected_corr = PBDF['HR'].astype(float).corr(PBDF['SO'].astype(float))
+
+    print('=' * 50)
+    print(f'Home Runs vs Strike Outs for {len(PBDF)} records (draw and render to png)')
+    fig, baseline = time_chart(PBDF, len(PBDF))
+    plt.close(fig)
+    print(f'{"scatter":>12}: {baseline:8.2f}s')
+    fig, elapsed = time_chart(PBDF, 0)
+    # The hexbin is the chart's only collection, its array the count of each (non-empty) bin
+    binned = int(fig.axes[0].collections[0].get_array().sum())
+    title = fig.axes[0].get_title()
+    plt.close(fig)
+    print(f'{"density":>12}: {elapsed:8.2f}s (speedup {baseline / elapsed:.1f}x)')
+    if binned != present:
+        logging.critical('The density chart binned %d rows, expected %d', binned, present)
+        return 1
+    if not title.endswith(str(round(expected_corr, 2))):
+        logging.critical('The chart title "%s" does not have the correlation %.2f', title, expected_corr)
+        return 1
+
+    print('=' * 50)
+    print('A season without Strike Outs')
+    PBDF['SO'] = pd.Series(pd.NA, index=PBDF.index, dtype=PBDF['SO'].dtype)
+    for label, density_threshold in (('scatter', len(PBDF)), ('density', 0)):
+        fig, elapsed = time_chart(PBDF, density_threshold)
+        drawn = len(fig.axes[0].collections) + len(fig.axes[0].lines)
+        plt.close(fig)
+        print(f'{label:>12}: {elapsed:8.2f}s')
+        # Nothing to bin or fit, but the scatterplot still has its (empty) collection of points
+        if label == 'density' and drawn:
+            logging.critical('The density chart without Strike Outs drew %d bins or lines', drawn)
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,11 @@
 """
 File name: pandas_example.py
 Description: Reads a csv file of 2022 baseball batting
-    statistics and produces some simple analyses
+    statistics and produces some simple analyses. With --data_glob
+    and --chunksize, the same analyses are streamed over any number
+    of (multi-season) files without loading them into memory. With
+    --by, they are produced for each team or season instead, in a
+    pool of worker processes with --parallel.
 Author: Chris Zaleski
 Python Version: 3.x
 Date: 2022-11-08
@@ -14,78 +18,257 @@ Note: "numpy" should get installed by default as a dependency.
 File: "MLB Player Batting 2022.csv" is credited to www.baseball-reference.com
 """
 
+from __future__ import annotations
 import sys
-import argparse
+import contextlib
+import glob
+import io
+import itertools
 import logging
+import os
 import pathlib
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from batting_data_module import clean_batting_data, load_batting_data, read_batting_data
+from batting_aggregates_module import BattingAggregates, player_averages, player_hr_so, team_means
+from batting_schema_module import BATTING_DTYPES, memory_report
+from batting_slices_module import BattingSlices, SharedBattingSlices
+from logging_module import setup_logging
+from startup_module import lazy_import, script_parser
 
-def main() -> 1:
-    # --------------------------------------------------
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
-    # In the default path, a forward slash '/' is interpreted correctly in both Windows and Linux
-    parser.add_argument('-d', '--data_file', type=pathlib.Path, default='test_data/MLB Player Batting 2022.csv',
-        help='Location of the "MLB Player Batting 2022.csv" file.')
-    args = parser.parse_args()
-    # --------------------------------------------------
-    # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+pd = lazy_import('pandas')
 
-    # --------------------------------------------------
-    # Functionality starts here
-    PBDF = pd.read_csv(args.data_file)
-    # Update some column names for readability
-    PBDF = PBDF.rename(columns={'Name': 'Player', 'Tm': 'Team'})
-    # Remove records where Team is 'TOT' (this is an aggregate and creates redundancy)
-    PBDF = PBDF[PBDF['Team'] != 'TOT']
-    # change default 'object' dtypes to pandas preferred string type
-    PBDF[['Player', 'Team', 'Lg', 'Pos Summary', 'Name-additional']] = \
-        PBDF[['Player', 'Team', 'Lg', 'Pos Summary', 'Name-additional']].astype(pd.StringDtype())
+class BattingAccumulator:
+    """
+    Incrementally computes the per-team and per-player sum/count tables (see
+    BattingAggregates) from chunks of the cleaned batting data. Only these
+    tables are kept, so memory grows with the number of teams and players,
+    not with the number of rows.
+    """
+
+    def __init__(self, min_games: int = 50, min_hr_so_pa: int = 50):
+        self.min_games = min_games
+        self.min_hr_so_pa = min_hr_so_pa
+        self.teams = set()
+        self.players = set()
+        self.team_sums = None
+        self.player_sums = None
+        self.player_hr_so_sums = None
+
+    @staticmethod
+    def _add(total: pd.DataFrame | None, part: pd.DataFrame) -> pd.DataFrame:
+        # Summing the stacked partial results (rather than DataFrame.add) keeps integer dtypes
+        return part if total is None else pd.concat([total, part]).groupby(level=0).sum()
+
+    def update(self, PBDF: pd.DataFrame) -> None:
+        """
+        Add a chunk of the cleaned batting data.
+
+        Parameters
+        ----------
+        PBDF : pd.DataFrame
+            A chunk of the cleaned batting DataFrame.
+        """
+        aggregates = BattingAggregates(PBDF)
+        self.teams.update(aggregates.teams)
+        self.players.update(aggregates.players)
+        self.team_sums = self._add(self.team_sums, aggregates.team_sums(self.min_games))
+        self.player_sums = self._add(self.player_sums, aggregates.player_sums())
+        self.player_hr_so_sums = self._add(self.player_hr_so_sums, aggregates.player_sums(self.min_hr_so_pa))
 
+def print_reports(team_count: int, player_count: int, team_means: pd.DataFrame,
+        player_averages: pd.DataFrame, player_hr_so: pd.DataFrame, min_games: int = 50,
+        min_ba_pa: int = 200, min_hr_so_pa: int = 50) -> None:
+    """
+    Print the reports.
+
+    Parameters
+    ----------
+    team_count : int
+        The number of distinct teams.
+    player_count : int
+        The number of distinct players.
+    team_means : pd.DataFrame
+        Mean 'OPS' and 'HR' per team, for records with at least min_games games.
+    player_averages : pd.DataFrame
+        Total 'PA' and mean 'BA' per player.
+    player_hr_so : pd.DataFrame
+        Total 'HR' and 'SO' per player, for records with at least min_hr_so_pa
+        plate appearances.
+    min_games : int
+        The games threshold used for team_means.
+    min_ba_pa : int
+        Only players with more plate appearances than this are ranked by batting average.
+    min_hr_so_pa : int
+        The plate appearances threshold used for player_hr_so.
+    """
     # NOTE: The 'queries' of the Dataframe shown below intentionally attempt
     # to show a variety of pandas functionality
-    team_count = PBDF['Team'].nunique()
-    player_count = PBDF['Player'].nunique()
     print('=' * 50)
     print('The file contains', team_count, 'teams and', player_count, 'players')
     print('=' * 50)
     print('Here is the mean On-base Plus Slugging and Home Runs for each\n',
-        'team, but only including players with at least 50 games:', sep='')
-    result = (PBDF[PBDF['G'] >= 50].groupby('Team').mean(numeric_only=True)[['OPS', 'HR']]
-        .sort_values(by='OPS', ascending=False)).round({'OPS':3, 'HR':1})
+        f'team, but only including players with at least {min_games} games:', sep='')
+    result = team_means.sort_values(by='OPS', ascending=False).round({'OPS':3, 'HR':1})
     print('-' * 50)
     print(result.to_string())
 
     print('=' * 50)
     print('Here are the top 10 Battting Averages for players with at\n',
-        'least 200 Plate Appearances:', sep='')
-    # We must group by player to account for players who played for multiple teams
-    result = (PBDF[['PA', 'Player', 'BA']].groupby('Player').agg({'PA':'sum', 'BA':'mean'})
-        .query('PA > 200').nlargest(10, 'BA')['BA'])
+        f'least {min_ba_pa} Plate Appearances:', sep='')
+    # Players are grouped to account for players who played for multiple teams
+    result = player_averages.query('PA > @min_ba_pa').nlargest(10, 'BA')['BA']
     print('-' * 50)
     print(result.to_string())
 
     print('=' * 50)
     print('Here are the top 10 Home Run to Strike Out Ratios for players\n',
-        'with at least 50 Plate Appearances:', sep='')
-    # We must group by player to account for players who played for multiple teams
-    result = (PBDF.loc[lambda df: df['PA'] >= 50].groupby('Player').agg({'HR':'sum', 'SO':'sum'})
-        .eval('HSRatio=HR/SO').nlargest(10, 'HSRatio')).round({'HSRatio':3})
+        f'with at least {min_hr_so_pa} Plate Appearances:', sep='')
+    result = player_hr_so.eval('HSRatio=HR/SO').nlargest(10, 'HSRatio').round({'HSRatio':3})
     print('-' * 50)
     print(result.to_string())
 
+def slice_report(slices: BattingSlices, index: int, min_games: int = 50, min_ba_pa: int = 200,
+        min_hr_so_pa: int = 50) -> str:
+    """
+    Render the reports for one slice of the data, as print_reports prints them.
+
+    Parameters
+    ----------
+    slices : BattingSlices
+        The data, split by team or season.
+    index : int
+        The slice to report on.
+    min_games, min_ba_pa, min_hr_so_pa : int
+        The thresholds passed to print_reports.
+
+    Returns
+    -------
+    str
+        The text of the reports, with a heading naming the slice.
+    """
+    aggregates = BattingAggregates(slices.frame(index))
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        print('#' * 50)
+        print(f'{slices.by}: {slices.labels[index]}')
+        print_reports(aggregates.team_count, aggregates.player_count, aggregates.team_means(min_games),
+            aggregates.player_averages(), aggregates.player_hr_so(min_hr_so_pa),
+            min_games, min_ba_pa, min_hr_so_pa)
+    return report.getvalue()
+
+# The data of each --parallel worker process, attached once by _init_slice_worker
+_worker_slices = None
+
+def _init_slice_worker(handle: SharedBattingSlices) -> None:
+    global _worker_slices
+    _worker_slices = BattingSlices.attach(handle)
+
+def _worker_slice_report(index: int, *thresholds: int) -> str:
+    return slice_report(_worker_slices, index, *thresholds)
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('DEBUG', prog)
+    # In the default path, a forward slash '/' is interpreted correctly in both Windows and Linux
+    parser.add_argument('-d', '--data_file', type=pathlib.Path, default='test_data/MLB Player Batting 2022.csv',
+        help='Location of the "MLB Player Batting 2022.csv" file.')
+    parser.add_argument('-g', '--data_glob', type=str, default=None,
+        help='Report on all the csv files matching this pattern (e.g. "data/*.csv") instead of --data_file.')
+    parser.add_argument('-c', '--chunksize', type=int, default=None,
+        help='Stream the data in chunks of this many rows instead of loading it all into memory. '
+            'Memory use then only grows with the number of teams and players.')
+    parser.add_argument('--min_games', type=int, default=50,
+        help='Only include records with at least this many games in the team report.')
+    parser.add_argument('--min_ba_pa', type=int, default=200,
+        help='Only rank players with more than this many plate appearances by batting average.')
+    parser.add_argument('--min_hr_so_pa', type=int, default=50,
+        help='Only include records with at least this many plate appearances in the HR/SO report.')
+    parser.add_argument('--by', choices=('team', 'season'), default=None,
+        help='Produce the reports for each team, or for each season (csv file), instead of for all the data.')
+    parser.add_argument('--parallel', type=int, nargs='?', const=os.cpu_count() or 1, default=None,
+        help='Produce the reports of --by (team, if not given) in this many worker processes '
+            '(the number of CPUs if no value is given). The output is the same as without --parallel.')
+    parser.add_argument('--cache_dir', type=pathlib.Path, default='.cache',
+        help='Where to cache the cleaned data (in a binary format), so later runs skip parsing the csv file.')
+    parser.add_argument('--no_cache', action='store_true',
+        help='Always read the csv file, without using or updating the cache.')
+    parser.add_argument('--memory_report', action='store_true',
+        help='Print the memory used by each column with the default dtypes and with the compact schema.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+    # --------------------------------------------------
+    # Additional argument validation (if necessary)
+    if args.parallel is not None and args.parallel < 1:
+        logging.critical('--parallel must be at least 1')
+        return 1
+    if args.parallel is not None and args.by is None:
+        args.by = 'team'
+    if args.by and args.chunksize:
+        logging.critical('--by and --parallel cannot be used with --chunksize')
+        return 1
+
+    # --------------------------------------------------
+    # Functionality starts here
+    if args.data_glob:
+        data_files = sorted(glob.glob(args.data_glob))
+        if not data_files:
+            logging.critical('No files match --data_glob %s', args.data_glob)
+            return 1
+    else:
+        data_files = [args.data_file]
+    if args.memory_report:
+        for data_file in data_files:
+            print(memory_report(data_file).to_string())
+    if args.chunksize:
+        # Stream the files in chunks, keeping only the per-team/per-player accumulators in memory
+        accumulator = BattingAccumulator(args.min_games, args.min_hr_so_pa)
+        for data_file in data_files:
+            for chunk in pd.read_csv(data_file, dtype=BATTING_DTYPES, chunksize=args.chunksize):
+                accumulator.update(clean_batting_data(chunk))
+        print_reports(len(accumulator.teams), len(accumulator.players), team_means(accumulator.team_sums),
+            player_averages(accumulator.player_sums), player_hr_so(accumulator.player_hr_so_sums),
+            args.min_games, args.min_ba_pa, args.min_hr_so_pa)
+        return 0
+    if args.data_glob:
+        frames = [read_batting_data(data_file) for data_file in data_files]
+    else:
+        # Read and clean the csv file, or load the result of that from the cache
+        frames = [load_batting_data(args.data_file, None if args.no_cache else args.cache_dir)]
+    if args.by == 'season':
+        # Each csv file holds one season
+        frames = [frame.assign(Season=pathlib.Path(data_file).stem) for frame, data_file in zip(frames, data_files)]
+    PBDF = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if args.by:
+        slices = BattingSlices.from_frame(PBDF, args.by.title())
+        thresholds = (args.min_games, args.min_ba_pa, args.min_hr_so_pa)
+        if args.parallel:
+            # Only needed here: it imports the multiprocessing shared memory support
+            from shared_result_module import SharedArray
+            # The workers attach to one shared copy of the data, rather than each being sent their slices
+            # (share starts the resource tracker, before the pool)
+            handle = slices.share()
+            with SharedArray(handle.data), ProcessPoolExecutor(args.parallel, initializer=_init_slice_worker,
+                    initargs=(handle,)) as executor:
+                chunksize = max(1, len(slices) // (4 * args.parallel))
+                reports = executor.map(_worker_slice_report, range(len(slices)),
+                    *(itertools.repeat(threshold) for threshold in thresholds), chunksize=chunksize)
+                # map returns the reports in slice order, so the output matches the serial run
+                for report in reports:
+                    print(report, end='')
+        else:
+            for index in range(len(slices)):
+                print(slice_report(slices, index, *thresholds), end='')
+        return 0
+    # One pass over the data builds the per-team/per-player tables every report is answered from
+    aggregates = BattingAggregates(PBDF)
+    print_reports(aggregates.team_count, aggregates.player_count, aggregates.team_means(args.min_games),
+        aggregates.player_averages(), aggregates.player_hr_so(args.min_hr_so_pa),
+        args.min_games, args.min_ba_pa, args.min_hr_so_pa)
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+File name: profiling_benchmark.py
+Description: Measures the overhead per call of the @timed, @sampled and
+    @counted decorators of profiling_module.py on a function that does
+    nothing, and checks that the stats count every call, including calls
+    made from several threads at once. Fails if a decorator adds more than
+    --max_overhead_ns nanoseconds per call.
+Python Version: 3.x
+"""
+
+import sys
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Callable
+import profiling_module
+from logging_module import setup_logging
+from profiling_module import counted, sampled, timed
+from startup_module import script_parser
+
+def noop(x: int) -> int:
+    return x
+
+def time_calls(func: Callable, calls: int, repeats: int) -> float:
+    """The best time per call (in ns) of calls calls of func, over repeats runs."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in itertools.repeat(None, calls):
+            func(1)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / calls
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-n', '--num_calls', type=int, default=1_000_000,
+        help='The number of calls timed per run.')
+    parser.add_argument('-r', '--repeats', type=int, default=5,
+        help='The number of runs. The fastest one is reported.')
+    parser.add_argument('-t', '--threads', type=int, default=4,
+        help='The number of threads calling the decorated functions at once, to check the merged counts.')
+    parser.add_argument('--max_overhead_ns', type=float, default=1000,
+        help='Fail if a decorator adds more than this many nanoseconds per call.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    decorated = {
+        'timed': timed(noop, name='timed'),
+        'sampled': sampled(noop, every=100, name='sampled'),
+        'counted': counted(noop, name='counted'),
+    }
+    print(f'Overhead per call ({args.num_calls} calls, best of {args.repeats})')
+    baseline = time_calls(noop, args.num_calls, args.repeats)
+    print(f'{"undecorated":>12}: {baseline:7.1f}ns')
+    failed = False
+    for name, func in decorated.items():
+        overhead = time_calls(func, args.num_calls, args.repeats) - baseline
+        print(f'{name:>12}: {overhead:+7.1f}ns')
+        if overhead > args.max_overhead_ns:
+            logging.critical('@%s adds %.0fns per call (more than %.0fns)', name, overhead, args.max_overhead_ns)
+            failed = True
+
+    # Every call so far, plus the same number again from each thread
+    def call_all() -> None:
+        for func in decorated.values():
+            for _ in itertools.repeat(None, args.num_calls):
+                func(1)
+
+    threads = [threading.Thread(target=call_all) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = args.num_calls * (args.repeats + args.threads)
+    functions = profiling_module.summary()['functions']
+    for name in decorated:
+        if functions[name]['calls'] != expected:
+            logging.critical('@%s counted %d calls, expected %d', name, functions[name]['calls'], expected)
+            failed = True
+    if not failed:
+        print(f'All {expected} calls of each function counted, over {args.threads + 1} threads')
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
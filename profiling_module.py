@@ -0,0 +1,315 @@
+import atexit
+import functools
+import itertools
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import pathlib
+import threading
+from time import perf_counter_ns
+
+# Latencies are counted in powers of 2 buckets: bucket b holds the calls that took
+# from 2**(b-1) to 2**b - 1 nanoseconds (bucket 0 those that took 0ns)
+BUCKETS = 65
+# The latencies a thread collects before adding them to its histogram. Appending to a list
+# is cheaper than updating the stats on every call, and this bounds its memory.
+PENDING = 1024
+# Where the stats are dumped (set by enable). Worker processes inherit it through the environment.
+OUTPUT_ENV = 'PROFILING_OUTPUT'
+
+class _Stats:
+    """
+    The stats of one decorated function in one thread. Only that thread
+    updates it, so it needs no lock. Each timed call stands for every calls
+    (see sampled).
+    """
+    __slots__ = ('every', 'calls', 'errors', 'timed', 'total_ns', 'max_ns', 'buckets', 'pending')
+
+    def __init__(self, every: int = 1):
+        self.every = every
+        self.pending = []
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.timed = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * BUCKETS
+        # Cleared in place, since the decorators hold on to the list
+        self.pending.clear()
+
+    def flush(self) -> None:
+        """Add the pending latencies to the histogram."""
+        pending = self.pending
+        buckets = self.buckets
+        for elapsed in pending:
+            buckets[elapsed.bit_length()] += 1
+        self.timed += len(pending)
+        self.total_ns += sum(pending)
+        self.max_ns = max(self.max_ns, max(pending, default=0))
+        pending.clear()
+
+    def totals(self) -> dict:
+        """The stats, including the pending latencies, as a dict (see _merge_function)."""
+        # A copy, since the owning thread may be appending to it
+        pending = self.pending.copy()
+        buckets = self.buckets.copy()
+        for elapsed in pending:
+            buckets[elapsed.bit_length()] += 1
+        timed = self.timed + len(pending)
+        return {'calls': self.calls + timed * self.every, 'errors': self.errors, 'timed': timed,
+            'total_ns': self.total_ns + sum(pending), 'max_ns': max(self.max_ns, max(pending, default=0)),
+            'buckets': buckets}
+
+_lock = threading.Lock()
+# name -> the _Stats of each thread
+_stats = {}
+# The event counters of each thread (see count_event)
+_counters = []
+_counter_local = threading.local()
+
+def _name(func) -> str:
+    # Functions of the main script are '__mp_main__' in spawned worker processes
+    module = '__main__' if func.__module__ in ('__main__', '__mp_main__') else func.__module__
+    return f'{module}.{func.__qualname__}'
+
+def _thread_stats(local: threading.local, name: str, every: int = 1) -> _Stats:
+    # The first call of the function in this thread
+    stats = local.stats = _Stats(every)
+    local.pending = stats.pending
+    with _lock:
+        _stats.setdefault(name, []).append(stats)
+    return stats
+
+def timed(func=None, *, name: str | None = None):
+    """
+    Record the latency of every call of func in a histogram (see BUCKETS).
+    The stats are reported under name, by default the module and qualified
+    name of func. Use it as @timed or @timed(name='...').
+    NOTE: The stats of each thread are kept apart, so the calls don't
+    contend for a lock, and are merged when they are dumped.
+    """
+    if func is None:
+        return functools.partial(timed, name=name)
+    name = name or _name(func)
+    local = threading.local()
+
+    @functools.wraps(func)
+    def timed_func(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - start
+            try:
+                pending = local.pending
+            except AttributeError:
+                pending = _thread_stats(local, name).pending
+            pending.append(elapsed)
+            if len(pending) >= PENDING:
+                local.stats.flush()
+    return timed_func
+
+def sampled(func=None, *, every: int = 100, name: str | None = None):
+    """
+    Like timed, but only time 1 in every calls of func, for functions too
+    fast (or too hot) to time every call. The other calls cost a counter
+    increment. Use it as @sampled or @sampled(every=1000).
+    """
+    if func is None:
+        return functools.partial(sampled, every=every, name=name)
+    name = name or _name(func)
+    local = threading.local()
+    calls = itertools.count()
+
+    @functools.wraps(func)
+    def sampled_func(*args, **kwargs):
+        if next(calls) % every:
+            return func(*args, **kwargs)
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - start
+            try:
+                pending = local.pending
+            except AttributeError:
+                pending = _thread_stats(local, name, every).pending
+            pending.append(elapsed)
+            if len(pending) >= PENDING:
+                local.stats.flush()
+    return sampled_func
+
+def counted(func=None, *, name: str | None = None):
+    """
+    Count the calls of func, and the calls that raised an exception. Use it
+    as @counted or @counted(name='...') (see timed).
+    """
+    if func is None:
+        return functools.partial(counted, name=name)
+    name = name or _name(func)
+    local = threading.local()
+
+    @functools.wraps(func)
+    def counted_func(*args, **kwargs):
+        try:
+            stats = local.stats
+        except AttributeError:
+            stats = _thread_stats(local, name)
+        stats.calls += 1
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            stats.errors += 1
+            raise
+    return counted_func
+
+def count_event(name: str, count: int = 1) -> None:
+    """
+    Add count to the event counter name, e.g. for the retries of a function
+    or the values a decorator rejected.
+    """
+    try:
+        counters = _counter_local.counters
+    except AttributeError:
+        counters = _counter_local.counters = {}
+        with _lock:
+            _counters.append(counters)
+    counters[name] = counters.get(name, 0) + count
+
+def _snapshot() -> dict:
+    # The raw stats of this process, merged over its threads
+    functions = {}
+    with _lock:
+        for name, thread_stats in _stats.items():
+            merged = {'calls': 0, 'errors': 0, 'timed': 0, 'total_ns': 0, 'max_ns': 0, 'buckets': [0] * BUCKETS}
+            for stats in thread_stats:
+                _merge_function(merged, stats.totals())
+            if merged['calls'] or merged['errors']:
+                functions[name] = merged
+        counters = {}
+        for thread_counters in _counters:
+            for name, count in list(thread_counters.items()):
+                counters[name] = counters.get(name, 0) + count
+    return {'processes': 1, 'functions': functions, 'counters': counters}
+
+def _merge_function(merged: dict, stats: dict) -> None:
+    for key in ('calls', 'errors', 'timed', 'total_ns'):
+        merged[key] += stats[key]
+    merged['max_ns'] = max(merged['max_ns'], stats['max_ns'])
+    merged['buckets'] = [a + b for a, b in zip(merged['buckets'], stats['buckets'])]
+
+def _merge(merged: dict, snapshot: dict) -> None:
+    merged['processes'] += snapshot['processes']
+    for name, stats in snapshot['functions'].items():
+        if name in merged['functions']:
+            _merge_function(merged['functions'][name], stats)
+        else:
+            merged['functions'][name] = stats
+    for name, count in snapshot['counters'].items():
+        merged['counters'][name] = merged['counters'].get(name, 0) + count
+
+def _percentile_us(buckets: list[int], timed: int, max_ns: int, percent: float) -> float:
+    # The upper bound of the bucket holding the percentile (so within a factor of 2), or the maximum
+    rank = percent / 100 * timed
+    total = 0
+    for bucket, count in enumerate(buckets):
+        total += count
+        if count and total >= rank:
+            return min(2**bucket - 1, max_ns) / 1000
+    return 0.0
+
+def summary(snapshot: dict | None = None) -> dict:
+    """
+    The stats of this process (or of snapshot), as a JSON compatible dict:
+    for each function the calls, errors, timed calls, total and mean time,
+    latency percentiles and histogram, and the event counters.
+    """
+    snapshot = snapshot or _snapshot()
+    functions = {}
+    for name, stats in sorted(snapshot['functions'].items()):
+        timed_calls = stats['timed']
+        functions[name] = {'calls': stats['calls'], 'errors': stats['errors'], 'timed_calls': timed_calls}
+        if timed_calls:
+            buckets = stats['buckets']
+            functions[name].update({
+                'total_s': stats['total_ns'] / 1e9 * stats['calls'] / timed_calls,
+                'mean_us': stats['total_ns'] / timed_calls / 1000,
+                **{f'p{percent}_us': _percentile_us(buckets, timed_calls, stats['max_ns'], percent) for percent in (50, 90, 99)},
+                'max_us': stats['max_ns'] / 1000,
+                # Only the buckets in use, as {upper bound in ns: calls}
+                'histogram': {str(2**bucket - 1): count for bucket, count in enumerate(buckets) if count},
+            })
+    return {'processes': snapshot['processes'], 'functions': functions,
+        'counters': dict(sorted(snapshot['counters'].items()))}
+
+def _part_file(output_file: pathlib.Path, pid: int) -> pathlib.Path:
+    return output_file.with_name(f'{output_file.name}.{pid}.part')
+
+def dump(output_file: pathlib.Path | None = None) -> dict:
+    """
+    Write the summary of the stats to output_file (by default, the file
+    given to enable) as JSON, and return it. The stats of the worker
+    processes that have exited are merged in.
+    """
+    output_file = pathlib.Path(output_file or os.environ[OUTPUT_ENV])
+    snapshot = _snapshot()
+    for part_file in output_file.parent.glob(f'{output_file.name}.*.part'):
+        try:
+            _merge(snapshot, json.loads(part_file.read_text()))
+            part_file.unlink()
+        except (OSError, ValueError):
+            pass
+    stats = summary(snapshot)
+    output_file.write_text(json.dumps(stats, indent=2))
+    return stats
+
+def enable(output_file: pathlib.Path) -> None:
+    """
+    Dump the stats (see dump) to output_file when the program exits. The
+    stats of worker processes (e.g. of a ProcessPoolExecutor) are included
+    if they exit first, as they do when the executor is shut down.
+    """
+    output_file = pathlib.Path(output_file).resolve()
+    # Left over by an earlier run that didn't finish its dump
+    for part_file in output_file.parent.glob(f'{output_file.name}.*.part'):
+        part_file.unlink()
+    if os.environ.get(OUTPUT_ENV) != str(output_file):
+        os.environ[OUTPUT_ENV] = str(output_file)
+        atexit.register(dump, output_file)
+
+def _write_part() -> None:
+    # Called as a worker process exits: leave its stats for the parent's dump
+    output_file = os.environ.get(OUTPUT_ENV)
+    if not output_file:
+        return
+    snapshot = _snapshot()
+    if snapshot['functions'] or snapshot['counters']:
+        _part_file(pathlib.Path(output_file), os.getpid()).write_text(json.dumps(snapshot))
+
+def _start_worker(*_) -> None:
+    # A forked child starts with a copy of the parent's stats: clear them in place, since
+    # the threads' references to them are copied too
+    with _lock:
+        for thread_stats in _stats.values():
+            for stats in thread_stats:
+                stats.reset()
+        for counters in _counters:
+            counters.clear()
+    # Worker processes exit without running atexit handlers, but do run these finalizers
+    multiprocessing.util.Finalize(None, _write_part, exitpriority=10)
+
+class _AfterFork:
+    # register_after_fork needs an object to hold on to
+    pass
+
+_after_fork = _AfterFork()
+# Runs when a forked multiprocessing child process starts up
+multiprocessing.util.register_after_fork(_after_fork, _start_worker)
+if os.environ.get(OUTPUT_ENV):
+    # Imported in a child of a profiled process, e.g. a spawned worker (which doesn't run the
+    # after fork callbacks), so the profiled process called enable before this one started
+    multiprocessing.util.Finalize(None, _write_part, exitpriority=10)
@@ -0,0 +1,149 @@
+import hashlib
+import pathlib
+import pickle
+import sqlite3
+import sys
+import time
+from collections.abc import Callable
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0);
+'''
+# The lookups recorded (for the least recently used eviction) before they are written, in one
+# transaction, rather than one transaction per lookup
+TOUCH_BATCH = 1000
+
+def _module_name(func: Callable) -> str:
+    # The functions of a script are in '__main__' when it is run ('__mp_main__' in spawned
+    # workers), but in its own module when it is imported (e.g. by templates.py): use the
+    # script's module name either way, so both find the same results
+    module = func.__module__
+    if module in ('__main__', '__mp_main__'):
+        main = sys.modules.get(module)
+        spec = getattr(main, '__spec__', None)
+        if spec is not None:
+            # Run with python -m
+            return spec.name
+        if getattr(main, '__file__', None):
+            return pathlib.Path(main.__file__).stem
+    return module
+
+class ResultCache:
+    """
+    A content-addressed, on-disk (SQLite) cache of pickled results with a
+    size limit and least recently used eviction.
+
+    Keys are built by make_key from the function and its arguments, so the
+    arguments must be picklable and pickle the same way on every run
+    (true for the usual numbers, strings and tuples).
+    NOTE: The times of lookups are written in batches (see TOUCH_BATCH), by
+    put, flush and close, so the eviction order may miss the latest ones.
+    """
+
+    def __init__(self, cache_file: pathlib.Path, max_bytes: int = 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(_SCHEMA)
+        # key -> the time of its last lookup, not yet written
+        self._touched = {}
+
+    def __enter__(self) -> 'ResultCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def flush(self) -> None:
+        """Write the times of the lookups made since the last write."""
+        if self._touched:
+            with self.connection:
+                self._write_touched()
+
+    def _write_touched(self) -> None:
+        self.connection.executemany('UPDATE entries SET last_access = ? WHERE key = ?',
+            [(last_access, key) for key, last_access in self._touched.items()])
+        self._touched.clear()
+
+    @staticmethod
+    def make_key(func: Callable, *args, **kwargs) -> str:
+        """
+        Return the cache key for calling func with args and kwargs.
+
+        Parameters
+        ----------
+        func : Callable
+            The function, identified by its module and qualified name. The
+            functions of a script have the same key when it is run and when
+            it is imported.
+        *args, **kwargs
+            The arguments of the call.
+
+        Returns
+        -------
+        str
+            A SHA-256 hex digest.
+        """
+        call = (_module_name(func), func.__qualname__, args, sorted(kwargs.items()))
+        return hashlib.sha256(pickle.dumps(call, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+    def get(self, key: str, default: object = None) -> object:
+        """
+        Return the cached value for key (marking it as recently used), or
+        default if it is not cached.
+        """
+        row = self.connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self.flush()
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value: object) -> None:
+        """
+        Cache value under key, evicting the least recently used entries if
+        the cache grows over max_bytes. A value larger than max_bytes on its
+        own is not cached.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self.connection:
+            # Before evicting, so the entries just looked up are not evicted first
+            self._write_touched()
+            old = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time()))
+            # The running total is kept in the database, so processes sharing the cache agree on it
+            self.connection.execute('UPDATE totals SET size = size + ?', (len(data) - (old[0] if old else 0),))
+            (total,) = self.connection.execute('SELECT size FROM totals').fetchone()
+            if total > self.max_bytes:
+                self._evict(total - self.max_bytes)
+
+    def _evict(self, excess: int) -> None:
+        freed = 0
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM entries ORDER BY last_access'):
+            evicted.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        self.connection.execute('UPDATE totals SET size = size - ?', (freed,))
@@ -12,9 +12,9 @@ environment you are running this script in.
 """
 
 import sys
-import argparse
 import logging
-import pathlib
+from logging_module import setup_logging
+from startup_module import script_parser
 
 def example_function(parameter_a: int = 1) -> str:
     """
@@ -31,28 +31,19 @@ def example_function(parameter_a: int = 1) -> str:
         A string saying something cool.
     """
     for x in range(parameter_a):
-        logging.error(f'Test Error message {str(x+1)}')
+        # The message is only formatted if ERROR messages are logged
+        logging.error('Test Error message %d', x + 1)
     return 'Did it!'
 
-def main() -> 1:
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
     # --------------------------------------------------
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Please use command line options in the form --commands')
-    log_levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log_level', default='DEBUG', choices=log_levels, 
-        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
-    parser.add_argument('--log_file', type=pathlib.Path, default=None,
-        help='Log file location. If not specified, log messages will be printed to the screen.')
-    args = parser.parse_args()
+    parser = script_parser('DEBUG', prog)
+    args = parser.parse_args(argv)
     # --------------------------------------------------
     # Set up logging
-    if args.log_file:
-        # Note: filemode is set to clobber by default
-        logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', filename=args.log_file, filemode='w',
-            level=args.log_level, datefmt='%Y/%m/%d %I:%M:%S')
-    else:
-        logging.basicConfig(format='%(levelname)s:%(message)s',
-            level=args.log_level, stream=sys.stdout)
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
     # --------------------------------------------------
     # Additional argument validation (if necessary)
 
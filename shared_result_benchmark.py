@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+File name: shared_result_benchmark.py
+Description: Compares returning large NumPy arrays from ProcessPoolExecutor
+    jobs by pickling them with returning a shared memory handle
+    (see shared_result_module.py).
+Python Version: 3.x
+
+This script requires that "numpy" be installed within the Python
+environment you are running this script in.
+"""
+
+import sys
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from multiprocessing_as_completed import run_as_completed
+from logging_module import setup_logging
+from shared_result_module import SharedArray, ensure_tracker, share_array
+from startup_module import script_parser
+
+def make_result(job_id: int = 1, size_mb: int = 100, shared: bool = False) -> np.ndarray:
+    """
+    Creates a large array (filled with job_id). Returns it, or a handle to a
+    shared memory copy of it.
+
+    Parameters
+    ----------
+    job_id : int
+        A unique job number.
+    size_mb : int
+        The size of the array (in MB).
+    shared : bool
+        Return a SharedResult handle instead of the array.
+
+    Returns
+    -------
+    np.ndarray | SharedResult
+        The array, or its handle.
+    """
+    array = np.full(size_mb * 1024 * 1024 // 8, job_id, dtype=np.float64)
+    return share_array(array) if shared else array
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('WARNING', prog)
+    parser.add_argument('-n', '--num_jobs', type=int, default=8,
+        help='The number of jobs to run.')
+    parser.add_argument('-s', '--size_mb', type=int, default=100,
+        help='The size of each result (in MB).')
+    parser.add_argument('-w', '--max_workers', type=int, default=2,
+        help='The number of worker processes.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    print(f'{args.num_jobs} jobs returning {args.size_mb} MB each, {args.max_workers} workers')
+    timings = {}
+    # Before the pool, so the workers share this process's tracker
+    ensure_tracker()
+    with ProcessPoolExecutor(max_workers=args.max_workers) as PPE:
+        # Warm up the pool, so process start up isn't counted against the first run
+        list(PPE.map(int, range(args.max_workers)))
+        for transport, shared in (('pickle', False), ('shared', True)):
+            job_args = ((n, args.size_mb, shared) for n in range(args.num_jobs))
+            start = time.perf_counter()
+            for (job_id, _, _), result in run_as_completed(PPE, make_result, job_args, 2 * args.max_workers):
+                if shared:
+                    with SharedArray(result) as shared_array:
+                        correct = shared_array.array[-1] == job_id
+                else:
+                    correct = result[-1] == job_id
+                if not correct:
+                    logging.critical('Job #%d returned the wrong result using %s', job_id, transport)
+                    return 1
+            timings[transport] = time.perf_counter() - start
+            print(f'{transport:>8}: {timings[transport]:6.2f}s '
+                f'({args.num_jobs * args.size_mb / timings[transport]:.0f} MB/s)')
+    print(f'Speedup: {timings["pickle"] / timings["shared"]:.1f}x')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from startup_module import lazy_import
+
+np = lazy_import('numpy')
+
+# Blocks that were freed while views of them were still in use. They are unmapped
+# once those views are gone (see SharedArray.close).
+_deferred_close = []
+
+def _as_array(shm: shared_memory.SharedMemory, shape: tuple, dtype: np.dtype) -> np.ndarray:
+    # np.frombuffer keeps the block's buffer exported for as long as the array (or
+    # any view of it) exists, so the block can't be unmapped from under it.
+    # The block may be larger than requested (rounded up to a page), hence count.
+    return np.frombuffer(shm.buf, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+def ensure_tracker() -> None:
+    """
+    Start the resource tracker of this process, if it isn't running yet. Call
+    it before creating a pool whose workers share arrays (see share_array),
+    so they share the parent's tracker. Otherwise each worker starts its own
+    tracker, which then reports (and tries to remove) the blocks the worker
+    created but the parent freed. It is a separate process, so it isn't
+    started when this module is imported.
+    """
+    resource_tracker.ensure_running()
+
+@dataclass(frozen=True)
+class SharedResult:
+    """
+    A small, picklable handle to an array stored in a shared memory block.
+    Return it from a job instead of the array itself; see share_array.
+    """
+    name: str
+    shape: tuple
+    dtype: str
+
+def share_array(array: np.ndarray) -> SharedResult:
+    """
+    Copy array into a new shared memory block and return its handle. Meant to
+    be called in a worker process, in place of returning (and pickling) the
+    array. The parent must open the handle with SharedArray, which frees the
+    block. NOTE: Only plain NumPy arrays are supported (e.g. use
+    DataFrame.to_numpy() for a numeric DataFrame).
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The array to share. Object arrays can't be shared.
+
+    Returns
+    -------
+    SharedResult
+        The handle to the shared copy of the array.
+    """
+    if array.dtype.hasobject:
+        raise TypeError('Arrays of Python objects cannot be shared')
+    # A no-op in a worker whose parent called it, as the worker inherits the tracker
+    ensure_tracker()
+    # A block can't be empty, even for an empty array
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    try:
+        _as_array(shm, array.shape, array.dtype)[...] = array
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    # The worker's mapping is closed, but the block lives on until the parent unlinks it
+    shm.close()
+    return SharedResult(shm.name, array.shape, array.dtype.str)
+
+class SharedArray:
+    """
+    Attaches to the shared memory block of a SharedResult. The array attribute
+    is a view of the block (no copy is made). Use it as a context manager (or
+    call close) to free the block. Views of the array that are still in use
+    keep the memory mapped (it is released when they are gone). With
+    unlink=False, close only detaches, for a block owned by another process
+    (e.g. input data shared with the workers of a pool).
+    """
+
+    def __init__(self, handle: SharedResult, unlink: bool = True):
+        self._shm = None
+        self._unlink = unlink
+        self._shm = shared_memory.SharedMemory(name=handle.name)
+        self.array = _as_array(self._shm, handle.shape, np.dtype(handle.dtype))
+
+    def __enter__(self) -> 'SharedArray':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __del__(self):
+        # Free the block even if close() was never called
+        self.close()
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        self.array = None
+        # Unlink first: the block is then freed as soon as the last mapping of it goes away
+        if self._unlink:
+            shm.unlink()
+        _deferred_close.append(shm)
+        # Unmap this block, and any earlier ones whose views have since been released
+        for deferred in list(_deferred_close):
+            try:
+                deferred.close()
+                _deferred_close.remove(deferred)
+            except BufferError:
+                pass
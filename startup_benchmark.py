@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+File name: startup_benchmark.py
+Description: Times the start up of the scripts (and of each command of
+    templates.py) with --help, in a new interpreter each run, with
+    python -X importtime to report the time spent importing modules.
+    Fails if a script imports pandas, NumPy or matplotlib just to start
+    (see startup_module.lazy_import), if its start up takes longer than
+    --max_ms, if it starts a helper process (e.g. the multiprocessing
+    resource tracker), or, with --baseline, if it is more than --tolerance
+    slower than the times saved by an earlier run with --save_baseline.
+Python Version: 3.x
+"""
+
+import sys
+import json
+import logging
+import pathlib
+import subprocess
+import time
+from logging_module import setup_logging
+from startup_module import script_parser
+
+# The modules no script should need to start (and --help) with their import time in
+# the same interpreter, for comparison
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib')
+ENTRY_POINTS = {
+    'templates': ['templates.py'],
+    'templates search': ['templates.py', 'search'],
+    'templates jobs': ['templates.py', 'jobs'],
+    'templates stats': ['templates.py', 'stats'],
+    'templates charts': ['templates.py', 'charts'],
+    'script_template': ['script_template.py'],
+    'decorator_example': ['decorator_example.py'],
+    'data_class_example': ['data_class_example.py'],
+    'file_search': ['file_search.py'],
+    'multiprocessing_as_completed': ['multiprocessing_as_completed.py'],
+    'pandas_example': ['pandas_example.py'],
+    'pandas_charts': ['pandas_charts.py'],
+}
+
+# Runs a script (sys.argv[1:]) as __main__, and reports the child processes still running
+# when it exits (on Linux, from /proc, and the multiprocessing resource tracker anywhere)
+_RUN_SCRIPT = '''
+import atexit, os, runpy, sys
+def report_children():
+    children = set()
+    try:
+        for task in os.listdir(f'/proc/{os.getpid()}/task'):
+            with open(f'/proc/{os.getpid()}/task/{task}/children') as f:
+                children.update(f.read().split())
+    except OSError:
+        pass
+    tracker = sys.modules.get('multiprocessing.resource_tracker')
+    if tracker is not None and tracker._resource_tracker._pid is not None:
+        children.add(str(tracker._resource_tracker._pid))
+    print(f'startup children: {len(children)}', file=sys.stderr)
+atexit.register(report_children)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+def time_startup(command: list[str]) -> tuple[float, float, set[str], int]:
+    """
+    Run command (a script and its arguments) in a new interpreter with
+    -X importtime. A command starting with '-c' is run as it is, otherwise
+    the script is run through _RUN_SCRIPT.
+
+    Parameters
+    ----------
+    command : list[str]
+        The script and its arguments.
+
+    Returns
+    -------
+    tuple[float, float, set[str], int]
+        The time until it exited and the time spent importing (both in
+        ms), the top level packages it imported, and the number of child
+        processes it left running.
+    """
+    if command[0] != '-c':
+        command = ['-c', _RUN_SCRIPT, *command]
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', *command], cwd=pathlib.Path(__file__).parent,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode:
+        raise RuntimeError(f'{" ".join(command)} exited with {result.returncode}: {result.stderr[-500:]}')
+    import_us = 0
+    packages = set()
+    children = 0
+    # Lines of "import time: <self us> | <cumulative us> | <module>", nested modules indented
+    for line in result.stderr.splitlines():
+        if line.startswith('startup children:'):
+            children = int(line.split(':')[1])
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line.split('|')
+        packages.add(name.strip().split('.')[0])
+        if not name.startswith('  '):
+            import_us += int(cumulative)
+    return elapsed, import_us / 1000, packages, children
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = script_parser('INFO', prog)
+    parser.add_argument('-r', '--runs', type=int, default=5,
+        help='The number of runs of each script. The fastest one is reported.')
+    parser.add_argument('--max_ms', type=float, default=500,
+        help='Fail if a script takes longer than this to start up (in ms).')
+    parser.add_argument('--baseline', type=pathlib.Path, default=None,
+        help='Fail if a script is more than --tolerance slower than in this JSON file (see --save_baseline).')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+        help='The fraction by which a script may be slower than --baseline.')
+    parser.add_argument('--save_baseline', type=pathlib.Path, default=None,
+        help='Write the start up times of this run to this JSON file, for --baseline.')
+    args = parser.parse_args(argv)
+    # --------------------------------------------------
+    # Set up logging
+    # Note: the log file is overwritten
+    setup_logging(args.log_level, args.log_file)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+    _, heavy_ms, _, _ = time_startup(['-c', f'import {", ".join(HEAVY_MODULES)}, matplotlib.pyplot'])
+    print(f'Importing {", ".join(HEAVY_MODULES)} and matplotlib.pyplot takes {heavy_ms:.0f}ms')
+    print('=' * 50)
+    print(f'Start up with --help (best of {args.runs} runs)')
+    failed = False
+    times = {}
+    for name, command in ENTRY_POINTS.items():
+        runs = [time_startup([*command, '--help']) for _ in range(args.runs)]
+        elapsed = min(run[0] for run in runs)
+        import_ms = min(run[1] for run in runs)
+        times[name] = elapsed
+        print(f'{name:>28}: {elapsed:6.0f}ms ({import_ms:5.0f}ms importing)')
+        heavy = sorted(set(HEAVY_MODULES) & runs[0][2])
+        if heavy:
+            logging.critical('%s imports %s to start up', name, ', '.join(heavy))
+            failed = True
+        if runs[0][3]:
+            logging.critical('%s starts %d helper process(es) to start up', name, runs[0][3])
+            failed = True
+        if elapsed > args.max_ms:
+            logging.critical('%s takes %.0fms to start up (more than %.0fms)', name, elapsed, args.max_ms)
+            failed = True
+        if name in baseline and elapsed > baseline[name] * (1 + args.tolerance):
+            logging.critical('%s takes %.0fms to start up, %.0f%% more than the %.0fms of %s', name, elapsed,
+                (elapsed / baseline[name] - 1) * 100, baseline[name], args.baseline)
+            failed = True
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(times, indent=2))
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
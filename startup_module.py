@@ -0,0 +1,66 @@
+import argparse
+import importlib
+import pathlib
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+class LazyModule:
+    """
+    Stands in for a module (see lazy_import), which is imported the first
+    time one of its attributes is used. Each attribute is then kept on the
+    stand-in, so later uses cost a plain attribute lookup (like a name from
+    "from module import name", it isn't updated if the module rebinds it).
+    """
+
+    def __init__(self, name: str):
+        self._lazy_name = name
+
+    def __getattr__(self, attr: str) -> object:
+        # Only called for the attributes not kept yet
+        if attr.startswith('__') and attr.endswith('__'):
+            # e.g. copy and pickle probing for __getstate__, which mustn't import the module
+            raise AttributeError(attr)
+        value = getattr(importlib.import_module(self._lazy_name), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f'<lazy module {self._lazy_name!r}>'
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Import module name on first use, e.g. pd = lazy_import('pandas'), for
+    the libraries that take a long time to import (pandas, NumPy,
+    matplotlib), so a script that doesn't need them (e.g. for --help or an
+    argument error) doesn't pay for them.
+    NOTE: A module using it needs "from __future__ import annotations", so
+    annotations like pd.DataFrame aren't evaluated when it is imported.
+    """
+    return LazyModule(name)
+
+def script_parser(log_level: str = 'INFO', prog: str | None = None,
+        description: str = 'Please use command line options in the form --commands') -> argparse.ArgumentParser:
+    """
+    The argument parser of a script, with the --log_level and --log_file
+    options every script has (see logging_module.setup_logging).
+
+    Parameters
+    ----------
+    log_level : str
+        The default of --log_level.
+    prog : str | None
+        The name of the program in the help. None uses the script's name.
+    description : str
+        The description in the help.
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        The parser, to add the script's own options to.
+    """
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    parser.add_argument('--log_level', default=log_level, choices=LOG_LEVELS,
+        help='Verbosity of logging: DEBUG, INFO, WARNING, ERROR, CRITICAL')
+    parser.add_argument('--log_file', type=pathlib.Path, default=None,
+        help='Log file location. If not specified, log messages will be printed to the screen.')
+    return parser
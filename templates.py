@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+File name: templates.py
+Description: One entry point for the main scripts, as commands:
+    templates.py search   (file_search.py)
+    templates.py jobs     (multiprocessing_as_completed.py)
+    templates.py stats    (pandas_example.py)
+    templates.py charts   (pandas_charts.py)
+    The options after the command are those of its script, e.g.
+    templates.py stats --by team --log_level INFO, and
+    templates.py stats --help lists them. Only the script of the command
+    is imported, and pandas, NumPy and matplotlib are only imported when
+    they are used, so --help or a bad option answers at once.
+Python Version: 3.x
+"""
+
+import sys
+import argparse
+import importlib
+
+# command -> (the script's module, its description)
+COMMANDS = {
+    'search': ('file_search', 'Search for files by name (or contents).'),
+    'jobs': ('multiprocessing_as_completed', 'Run jobs in a pool, printing the results as they complete.'),
+    'stats': ('pandas_example', 'Reports on the batting statistics.'),
+    'charts': ('pandas_charts', 'Charts of the batting statistics.'),
+}
+
+def main(argv: list[str] | None = None) -> 1:
+    # --------------------------------------------------
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Run one of the scripts. '
+        'Use "<command> --help" for the options of a command.')
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+    for command, (_, description) in COMMANDS.items():
+        # The command's options (including --help) are left for its script to parse
+        commands.add_parser(command, help=description, add_help=False)
+    args, command_args = parser.parse_known_args(argv)
+
+    # --------------------------------------------------
+    # Functionality starts here
+    script = importlib.import_module(COMMANDS[args.command][0])
+    return script.main(command_args, f'{parser.prog} {args.command}')
+
+if __name__ == '__main__':
+    sys.exit(main())